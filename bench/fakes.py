@@ -0,0 +1,323 @@
+# bench/fakes.py — faux backends Helix (HTTP local) et Discord (en mémoire) pour les benchmarks
+
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from datetime import datetime, UTC, timedelta
+
+import aiohttp
+import discord
+from aiohttp import web
+
+GAMES = ("League of Legends", "Rocket League", "Rainbow Six Siege", "Chess", "Just Chatting")
+# URL Twitch codées en dur dans bot.py (toutes versions) -> chemin sur le faux serveur
+TWITCH_URL_PREFIXES = {
+    'https://api.twitch.tv/helix': '/helix',
+    'https://id.twitch.tv/oauth2': '/oauth2'
+}
+
+def streamer_login(index):
+    return f"streamer{index:05d}"
+
+def streamer_id(login):
+    """Identifiant Twitch déterministe : streamer00042 -> "1042" (None pour un login inconnu)"""
+    suffix = login[len("streamer"):]
+    if not login.startswith("streamer") or not suffix.isdigit():
+        return None
+    return str(int(suffix) + 1000)
+
+class FakeHelix:
+    """Faux serveur Helix : oauth2/token, helix/users et helix/streams, avec latence et quota simulés"""
+    def __init__(self, streamer_count, live_ratio, latency_ms, seed=42, ratelimit=800):
+        self.streamer_count = streamer_count
+        self.live_ratio = live_ratio
+        self.latency = latency_ms / 1000
+        self.rng = random.Random(seed)
+        self.ratelimit = ratelimit
+        self.used = 0
+        self.window_reset = int(time.time()) + 60
+        self.requests = {'token': 0, 'users': 0, 'streams': 0, 'other': 0}
+        self.live = {}  # user_id -> stream
+        for index in range(streamer_count):
+            if self.rng.random() < live_ratio:
+                self._go_live(streamer_login(index))
+        self.runner = None
+        self.base_url = None
+        self.original_request = None
+
+    def _go_live(self, login):
+        user_id = streamer_id(login)
+        index = int(user_id) - 1000
+        self.live[user_id] = {
+            'id': f"{user_id}{self.rng.randrange(10 ** 6)}",
+            'user_id': user_id,
+            'user_login': login,
+            'user_name': login.capitalize(),
+            'game_name': GAMES[index % len(GAMES)],
+            'title': f"Stream de {login}",
+            'viewer_count': self.rng.randrange(5, 20000),
+            'started_at': (datetime.now(UTC) - timedelta(minutes=self.rng.randrange(1, 300))).isoformat().replace('+00:00', 'Z'),
+            'thumbnail_url': f"https://static-cdn.jtvnw.net/previews-ttv/live_user_{login}-{{width}}x{{height}}.jpg"
+        }
+
+    def go_live(self, login):
+        if streamer_id(login) not in self.live:
+            self._go_live(login)
+        return self.live[streamer_id(login)]
+
+    def go_offline(self, login):
+        self.live.pop(streamer_id(login), None)
+
+    def advance(self, live_churn, viewer_churn):
+        """Simuler une minute : nouveau quota, streams qui démarrent / s'arrêtent, viewers qui bougent"""
+        self.used = 0
+        self.window_reset = int(time.time()) + 60
+        for index in range(self.streamer_count):
+            if self.rng.random() >= live_churn:
+                continue
+            login = streamer_login(index)
+            user_id = streamer_id(login)
+            if user_id in self.live:
+                del self.live[user_id]
+            else:
+                self._go_live(login)
+        for stream in self.live.values():
+            if self.rng.random() < viewer_churn:
+                stream['viewer_count'] = max(0, int(stream['viewer_count'] * self.rng.uniform(0.7, 1.3)))
+
+    async def _respond(self, kind, payload):
+        self.requests[kind] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.used += 1
+        headers = {
+            'Ratelimit-Limit': str(self.ratelimit),
+            'Ratelimit-Remaining': str(max(self.ratelimit - self.used, 0)),
+            'Ratelimit-Reset': str(self.window_reset)
+        }
+        if self.used > self.ratelimit:
+            return web.json_response({'error': 'Too Many Requests'}, status=429, headers=headers)
+        return web.json_response(payload, headers=headers)
+
+    async def token(self, request):
+        self.requests['token'] += 1
+        return web.json_response({'access_token': 'bench-token', 'expires_in': 60 * 86400, 'token_type': 'bearer'})
+
+    async def users(self, request):
+        data = []
+        for login in request.query.getall('login', []):
+            user_id = streamer_id(login)
+            if user_id is not None and int(user_id) - 1000 < self.streamer_count:
+                data.append({'id': user_id, 'login': login, 'display_name': login.capitalize()})
+        return await self._respond('users', {'data': data})
+
+    async def streams(self, request):
+        # Polling par identifiant (user_id) ou, dans les anciennes versions du bot, par login (user_login)
+        user_ids = request.query.getall('user_id', []) + [
+            streamer_id(login) for login in request.query.getall('user_login', [])
+        ]
+        data = [self.live[user_id] for user_id in user_ids if user_id in self.live]
+        return await self._respond('streams', {'data': data, 'pagination': {}})
+
+    async def other(self, request):
+        return await self._respond('other', {'data': []})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/oauth2/token', self.token)
+        app.router.add_get('/helix/users', self.users)
+        app.router.add_get('/helix/streams', self.streams)
+        app.router.add_route('*', '/helix/{tail:.*}', self.other)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        self.uninstall()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def install(self):
+        """Rediriger toutes les requêtes aiohttp vers api.twitch.tv / id.twitch.tv sur le faux serveur.
+        
+        Fonctionne quelle que soit la version de bot.py (URL codées en dur ou configurables)."""
+        if self.original_request is not None:
+            return
+        original = self.original_request = aiohttp.ClientSession._request
+        base_url = self.base_url
+
+        async def _request(session, method, str_or_url, *args, **kwargs):
+            url = str(str_or_url)
+            for prefix, path in TWITCH_URL_PREFIXES.items():
+                if url.startswith(prefix):
+                    url = base_url + path + url[len(prefix):]
+                    break
+            return await original(session, method, url, *args, **kwargs)
+
+        aiohttp.ClientSession._request = _request
+
+    def uninstall(self):
+        if self.original_request is not None:
+            aiohttp.ClientSession._request = self.original_request
+            self.original_request = None
+
+def eventsub_timestamp(moment=None):
+    """Horodatage RFC 3339 comme Twitch (nanosecondes comprises)"""
+    moment = moment or datetime.now(UTC)
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.%f') + '123Z'
+
+class FakeEventSub:
+    """Messages EventSub signés comme Twitch : HMAC-SHA256(secret, message_id + timestamp + corps)"""
+    def __init__(self, secret, callback):
+        self.secret = secret
+        self.callback = callback
+
+    def sign(self, message_id, timestamp, body, secret=None):
+        digest = hmac.new((secret or self.secret).encode(), message_id.encode() + timestamp.encode() + body, hashlib.sha256)
+        return 'sha256=' + digest.hexdigest()
+
+    def subscription(self, sub_type, broadcaster_id, status='enabled'):
+        return {
+            'id': str(uuid.uuid4()),
+            'status': status,
+            'type': sub_type,
+            'version': '1',
+            'cost': 0,
+            'condition': {'broadcaster_user_id': broadcaster_id},
+            'transport': {'method': 'webhook', 'callback': self.callback},
+            'created_at': eventsub_timestamp()
+        }
+
+    def message(self, message_type, payload, message_id=None, timestamp=None, secret=None):
+        """(en-têtes, corps) d'une requête POST envoyée par Twitch au callback"""
+        body = json.dumps(payload).encode()
+        message_id = message_id or str(uuid.uuid4())
+        timestamp = timestamp or eventsub_timestamp()
+        subscription = payload['subscription']
+        headers = {
+            'Content-Type': 'application/json',
+            'Twitch-Eventsub-Message-Id': message_id,
+            'Twitch-Eventsub-Message-Retry': '0',
+            'Twitch-Eventsub-Message-Type': message_type,
+            'Twitch-Eventsub-Message-Signature': self.sign(message_id, timestamp, body, secret),
+            'Twitch-Eventsub-Message-Timestamp': timestamp,
+            'Twitch-Eventsub-Subscription-Type': subscription['type'],
+            'Twitch-Eventsub-Subscription-Version': subscription['version']
+        }
+        return headers, body
+
+    def challenge(self, login, sub_type='stream.online', challenge=None):
+        """Vérification du callback : le bot doit renvoyer `challenge` tel quel"""
+        challenge = challenge or uuid.uuid4().hex
+        payload = {
+            'challenge': challenge,
+            'subscription': self.subscription(sub_type, streamer_id(login), 'webhook_callback_verification_pending')
+        }
+        return challenge, self.message('webhook_callback_verification', payload)
+
+    def stream_online(self, login, **overrides):
+        event = {
+            'id': str(uuid.uuid4().int)[:11],
+            'broadcaster_user_id': streamer_id(login),
+            'broadcaster_user_login': login,
+            'broadcaster_user_name': login.capitalize(),
+            'type': 'live',
+            'started_at': eventsub_timestamp()
+        }
+        payload = {'subscription': self.subscription('stream.online', streamer_id(login)), 'event': event}
+        return self.message('notification', payload, **overrides)
+
+    def stream_offline(self, login, **overrides):
+        event = {
+            'broadcaster_user_id': streamer_id(login),
+            'broadcaster_user_login': login,
+            'broadcaster_user_name': login.capitalize()
+        }
+        payload = {'subscription': self.subscription('stream.offline', streamer_id(login)), 'event': event}
+        return self.message('notification', payload, **overrides)
+
+class FakeDiscord:
+    """Salons et messages en mémoire, avec une latence d'API simulée"""
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self.channels = {}
+        self.calls = {'send': 0, 'edit': 0, 'delete': 0, 'bulk_delete': 0}
+        self.live_messages = 0
+        self.snowflake_base = discord.utils.time_snowflake(datetime.now(UTC))
+        self.sequence = 0
+
+    def next_id(self):
+        self.sequence += 1
+        return self.snowflake_base + self.sequence
+
+    async def call(self, kind):
+        self.calls[kind] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def channel(self, channel_id):
+        if channel_id not in self.channels:
+            self.channels[channel_id] = FakeChannel(self, channel_id)
+        return self.channels[channel_id]
+
+    def install(self, bot):
+        """Remplacer les accès aux salons du bot par les faux salons"""
+        bot.get_channel = lambda channel_id: self.channels.get(channel_id)
+        bot.get_partial_messageable = lambda channel_id: self.channel(channel_id)
+
+class FakeGuild:
+    def __init__(self):
+        self.me = object()
+
+    def get_role(self, role_id):
+        return None
+
+class FakePermissions:
+    manage_messages = True
+
+class FakeChannel:
+    def __init__(self, backend, channel_id):
+        self.backend = backend
+        self.id = channel_id
+        self.guild = FakeGuild()
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self, message_id)
+
+    async def send(self, content=None, embed=None, embeds=None):
+        await self.backend.call('send')
+        payload = [embed.to_dict()] if embed is not None else [e.to_dict() for e in embeds or ()]
+        self.backend.live_messages += 1
+        return FakeMessage(self, self.backend.next_id(), content, payload)
+
+    async def delete_messages(self, messages):
+        await self.backend.call('bulk_delete')
+        self.backend.live_messages -= len(messages)
+
+class FakeMessage:
+    def __init__(self, channel, message_id, content=None, embeds=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.embeds = embeds or []
+
+    async def edit(self, content=None, embed=None, embeds=None):
+        await self.channel.backend.call('edit')
+        if embed is not None:
+            self.embeds = [embed.to_dict()]
+        return self
+
+    async def delete(self):
+        await self.channel.backend.call('delete')
+        self.channel.backend.live_messages -= 1
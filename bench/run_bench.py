@@ -0,0 +1,255 @@
+# bench/run_bench.py — benchmark hors ligne de check_streams et du système de notifications
+#
+# Exécute le vrai code du bot (bot.py) contre un faux Helix local et un faux Discord en mémoire,
+# puis écrit un rapport JSON (commit git inclus) comparable d'un commit à l'autre :
+#
+#   python bench/run_bench.py --scenario large --output bench-large.json
+#   python bench/run_bench.py --streamers 2000 --channels 200 --helix-latency 80 --ticks 10
+#
+# Les durées sont mesurées sans tracemalloc ; --tracemalloc ajoute le pic d'allocation Python
+# (au prix d'un ralentissement important : ne pas comparer les durées des deux modes).
+#
+# Seuls les points d'entrée stables sont appelés (check_streams.coro, notification_system.coro) ;
+# les compteurs propres aux versions récentes sont lus s'ils existent. Les URL Twitch sont
+# redirigées vers le faux serveur au niveau d'aiohttp, ce qui permet de mesurer un ancien commit :
+#
+#   git worktree add /tmp/bot-base <commit>
+#   python bench/run_bench.py --bot-dir /tmp/bot-base --output bench-base.json
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeHelix, FakeDiscord, streamer_login
+
+SCENARIOS = {
+    'small': {'streamers': 1000, 'channels': 100, 'per_channel': 10, 'events': 500},
+    'large': {'streamers': 10000, 'channels': 1000, 'per_channel': 10, 'events': 5000},
+    'overlap': {'streamers': 2000, 'channels': 1000, 'per_channel': 20, 'events': 2000},
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne du bot (faux Helix + faux Discord)")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='small')
+    parser.add_argument('--streamers', type=int, help="Nombre de streamers distincts")
+    parser.add_argument('--channels', type=int, help="Nombre de salons Discord")
+    parser.add_argument('--per-channel', type=int, help="Streamers suivis par salon")
+    parser.add_argument('--events', type=int, help="Événements échus pour le scénario notifications")
+    parser.add_argument('--ticks', type=int, default=5, help="Ticks de check_streams (une minute simulée chacun)")
+    parser.add_argument('--live-ratio', type=float, default=0.1)
+    parser.add_argument('--live-churn', type=float, default=0.02, help="Part des streamers qui changent d'état par tick")
+    parser.add_argument('--viewer-churn', type=float, default=0.3, help="Part des streams dont les viewers bougent par tick")
+    parser.add_argument('--helix-latency', type=float, default=50, help="Latence Helix simulée (ms)")
+    parser.add_argument('--discord-latency', type=float, default=20, help="Latence Discord simulée (ms)")
+    parser.add_argument('--full-poll', action='store_true', help="Ignorer les paliers : tous les logins à chaque tick")
+    parser.add_argument('--tracemalloc', action='store_true', help="Mesurer le pic d'allocation Python")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bot-dir', default=ROOT, help="Dossier contenant le bot.py à mesurer (ex: un git worktree)")
+    parser.add_argument('--notification-timeout', type=float, default=600, help="Durée maximale d'un passage de notifications (s)")
+    parser.add_argument('--output', help="Fichier JSON de sortie (stdout sinon)")
+    args = parser.parse_args()
+    for key, value in SCENARIOS[args.scenario].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    return args
+
+def git_revision(path):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=path, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    cwd=path, capture_output=True, text=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except Exception:
+        return {'commit': None, 'dirty': None}
+
+def peak_rss_mb():
+    # ru_maxrss : kilo-octets sous Linux, octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def advance_poll_clock(bot, seconds):
+    """Vieillir l'historique du polling adaptatif (s'il existe), comme si `seconds` s'étaient écoulées"""
+    scheduler = getattr(bot, 'poll_scheduler', None)
+    for entry in getattr(scheduler, 'history', {}).values():
+        entry['first_checked'] -= seconds
+        entry['last_checked'] -= seconds
+        if entry['last_live'] is not None:
+            entry['last_live'] -= seconds
+
+def polled_logins(bot):
+    """Logins interrogés au dernier tick (None si la version ne le mesure pas)"""
+    plan = getattr(getattr(bot, 'poll_scheduler', None), 'last_plan', None)
+    return sum(tier['polled'] for tier in plan.values()) if plan is not None else None
+
+async def drain_dispatcher(bot):
+    """Attendre la file d'envoi Discord (versions qui en ont une) puis les tâches qu'elle déclenche"""
+    dispatcher = getattr(bot, 'discord_dispatcher', None)
+    while dispatcher is not None and dispatcher.workers:
+        await asyncio.gather(*list(dispatcher.workers.values()), return_exceptions=True)
+
+def optional_stats(obj, attribute):
+    value = getattr(obj, attribute, None)
+    return dict(value) if value is not None else None
+
+async def bench_check_streams(bot, args, helix, fake_discord):
+    for channel_index in range(args.channels):
+        channel_id = 10 ** 6 + channel_index
+        fake_discord.channel(channel_id)
+        bot.streamers[channel_id] = [
+            streamer_login((channel_index * args.per_channel + offset) % args.streamers)
+            for offset in range(args.per_channel)
+        ]
+
+    ticks = []
+    for tick in range(args.ticks):
+        if tick:
+            helix.advance(args.live_churn, args.viewer_churn)
+            advance_poll_clock(bot, getattr(bot, 'POLL_BASE_TICK_SECONDS', 60))
+        helix_before = dict(helix.requests)
+        discord_before = dict(fake_discord.calls)
+        started = time.perf_counter()
+        await bot.check_streams.coro()
+        loop_done = time.perf_counter()
+        await drain_dispatcher(bot)
+        drained = time.perf_counter()
+        ticks.append({
+            'tick': tick,
+            'wall_s': round(loop_done - started, 4),
+            'wall_with_dispatch_s': round(drained - started, 4),
+            'polled': polled_logins(bot),
+            'helix': {kind: helix.requests[kind] - helix_before[kind] for kind in helix.requests},
+            'discord': {kind: fake_discord.calls[kind] - discord_before[kind] for kind in fake_discord.calls},
+            'stream_messages': len(bot.stream_messages)
+        })
+        print(f"  tick {tick}: {ticks[-1]['wall_s']}s, {ticks[-1]['polled'] if ticks[-1]['polled'] is not None else 'tous les'} "
+              f"login(s) interrogé(s)", file=sys.stderr)
+
+    warm = [tick['wall_s'] for tick in ticks[1:]] or [ticks[0]['wall_s']]
+    return {
+        'ticks': ticks,
+        'cold_tick_s': ticks[0]['wall_s'],
+        'warm_tick_mean_s': round(sum(warm) / len(warm), 4),
+        'warm_tick_max_s': max(warm),
+        'helix_requests': dict(helix.requests),
+        'discord_calls': dict(fake_discord.calls),
+        'embed_cache': optional_stats(getattr(bot, 'embed_cache', None), 'stats')
+    }
+
+def add_event(bot, event):
+    register = getattr(bot, 'register_event', None)
+    if register is not None:
+        register(event)
+        return
+    # Versions sans planificateur : notification_system parcourt directement ces dictionnaires
+    bot.events[event.id] = event
+    bot.notifications_sent[event.id] = {"15min": False, "live": False}
+    bot.notification_messages[event.id] = []
+
+def notifications_idle(bot):
+    """Plus rien d'échu : un passage de plus dormirait jusqu'à la prochaine échéance (versions planifiées)"""
+    scheduler = getattr(bot, 'notification_scheduler', None)
+    if scheduler is None:
+        return False
+    deadline = scheduler.next_deadline()
+    return deadline is None or deadline > bot.get_current_time().timestamp()
+
+async def bench_notifications(bot, args, fake_discord):
+    now = bot.get_current_time()
+    for index in range(args.events):
+        channel_id = 10 ** 6 + index % args.channels
+        fake_discord.channel(channel_id)
+        # Moitié à 15 minutes du début, moitié qui commence maintenant (15min puis live)
+        start = now + timedelta(minutes=15) - timedelta(seconds=1) if index % 2 else now - timedelta(seconds=1)
+        event = bot.Event(10 ** 6 + index, f"Match {index}", start, "bench", 1, channel_id, None, 'lec',
+                          None, None, None, None)
+        add_event(bot, event)
+
+    # Passages successifs de la boucle jusqu'à ce que plus rien ne soit envoyé
+    discord_before = dict(fake_discord.calls)
+    passes = []
+    while len(passes) < 5 and not notifications_idle(bot):
+        sends = fake_discord.calls['send']
+        started = time.perf_counter()
+        await asyncio.wait_for(bot.notification_system.coro(), args.notification_timeout)
+        await drain_dispatcher(bot)
+        if fake_discord.calls['send'] == sends:
+            break
+        passes.append(round(time.perf_counter() - started, 4))
+        print(f"  passage {len(passes)}: {passes[-1]}s, {fake_discord.calls['send'] - sends} envoi(s)", file=sys.stderr)
+    lag = getattr(bot, 'notification_lag', None)
+    expiry = getattr(bot, 'message_expiry', None)
+    return {
+        'events': args.events,
+        'wall_s': round(sum(passes), 4),
+        'passes': passes,
+        'discord': {kind: fake_discord.calls[kind] - discord_before[kind] for kind in fake_discord.calls},
+        'lag': lag.summary() if lag is not None else None,
+        'expiries_scheduled': len(expiry) if expiry is not None else None
+    }
+
+async def main(args):
+    helix = FakeHelix(args.streamers, args.live_ratio, args.helix_latency, seed=args.seed)
+    await helix.start()
+    helix.install()
+
+    # bot.py lit sa configuration à l'import
+    os.environ.update({'TWITCH_CLIENT_ID': 'bench', 'TWITCH_CLIENT_SECRET': 'bench', 'STATE_DB_PATH': ':memory:'})
+    logging.basicConfig(level=logging.WARNING)
+    sys.path.insert(0, os.path.abspath(args.bot_dir))
+    import bot
+
+    poll_tiers = getattr(bot, 'POLL_TIERS', None)
+    if args.full_poll and poll_tiers is not None:
+        for tier in poll_tiers:
+            poll_tiers[tier] = (0, 10 ** 6)
+    fake_discord = FakeDiscord(args.discord_latency)
+    fake_discord.install(bot.bot)
+    await bot.twitch_api.get_token()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    report = {
+        'git': git_revision(args.bot_dir),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'results': {}
+    }
+    print(f"📺 check_streams: {args.streamers} streamers, {args.channels} salons", file=sys.stderr)
+    report['results']['check_streams'] = await bench_check_streams(bot, args, helix, fake_discord)
+    print(f"🔔 notifications: {args.events} événements", file=sys.stderr)
+    report['results']['notifications'] = await bench_notifications(bot, args, fake_discord)
+    report['peak_rss_mb'] = peak_rss_mb()
+    if args.tracemalloc:
+        report['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+
+    close = getattr(bot.twitch_api, 'close', None)
+    if close is not None:
+        await close()
+    await helix.stop()
+    return report
+
+if __name__ == '__main__':
+    args = parse_args()
+    # Les anciennes versions écrivent leurs traces avec print : stdout reste réservé au rapport
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"✅ Rapport écrit dans {args.output}", file=sys.stderr)
+    else:
+        print(output)
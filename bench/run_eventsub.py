@@ -0,0 +1,185 @@
+# bench/run_eventsub.py — exercice hors ligne du callback EventSub (/eventsub)
+#
+# Envoie au vrai eventsub_callback de bot.py des requêtes signées comme celles de Twitch
+# (challenge de vérification, stream.online, stream.offline), plus des requêtes invalides,
+# et mesure le délai entre la notification et l'alerte publiée sur le faux Discord :
+#
+#   python bench/run_eventsub.py --streamers 20 --output eventsub.json
+#
+# Le code de sortie est non nul si une vérification échoue.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, UTC, timedelta
+
+import aiohttp
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeHelix, FakeDiscord, FakeEventSub, eventsub_timestamp, streamer_login
+
+SECRET = "bench-eventsub-secret"
+CHANNEL_ID = 10 ** 6
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exercice hors ligne du callback EventSub (faux Twitch + faux Discord)")
+    parser.add_argument('--streamers', type=int, default=10, help="Streamers qui passent en live puis hors ligne")
+    parser.add_argument('--helix-latency', type=float, default=20, help="Latence Helix simulée (ms)")
+    parser.add_argument('--discord-latency', type=float, default=20, help="Latence Discord simulée (ms)")
+    parser.add_argument('--timeout', type=float, default=10, help="Attente maximale d'une alerte (s)")
+    parser.add_argument('--output', help="Fichier JSON de sortie (stdout sinon)")
+    return parser.parse_args()
+
+async def wait_for(condition, timeout):
+    """Attendre qu'une condition devienne vraie ; renvoie le délai écoulé ou None"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if condition():
+            return time.perf_counter() - started
+        await asyncio.sleep(0.01)
+    return None
+
+async def post(session, url, message):
+    headers, body = message
+    async with session.post(url, data=body, headers=headers) as response:
+        return response.status, await response.text()
+
+async def run(bot, args, helix, fake_discord, callback_url):
+    checks = {}
+    eventsub = FakeEventSub(SECRET, callback_url)
+    logins = [streamer_login(index) for index in range(args.streamers)]
+    bot.streamers[CHANNEL_ID] = list(logins)
+    fake_discord.channel(CHANNEL_ID)
+
+    # Signature seule, sans passer par HTTP
+    headers, body = eventsub.stream_online(logins[0])
+    message_id = headers['Twitch-Eventsub-Message-Id']
+    timestamp = headers['Twitch-Eventsub-Message-Timestamp']
+    signature = headers['Twitch-Eventsub-Message-Signature']
+    checks['signature_valid'] = bot.verify_eventsub_signature(SECRET, message_id, timestamp, body, signature)
+    checks['signature_wrong_secret_rejected'] = not bot.verify_eventsub_signature("autre", message_id, timestamp, body, signature)
+    checks['signature_tampered_body_rejected'] = not bot.verify_eventsub_signature(
+        SECRET, message_id, timestamp, body.replace(b'live', b'LIVE'), signature)
+    checks['signature_missing_rejected'] = not bot.verify_eventsub_signature(SECRET, message_id, timestamp, body, None)
+
+    async with aiohttp.ClientSession() as session:
+        challenge, message = eventsub.challenge(logins[0])
+        status, text = await post(session, callback_url, message)
+        checks['challenge_echoed'] = status == 200 and text == challenge
+
+        status, _ = await post(session, callback_url, eventsub.stream_online(logins[0], secret="autre"))
+        checks['bad_signature_403'] = status == 403
+        stale = eventsub_timestamp(datetime.now(UTC) - timedelta(minutes=15))
+        status, _ = await post(session, callback_url, eventsub.stream_online(logins[0], timestamp=stale))
+        checks['stale_timestamp_403'] = status == 403
+        checks['rejected_messages_ignored'] = await wait_for(lambda: fake_discord.calls['send'] > 0, 0.5) is None
+
+        # stream.online : une alerte par streamer, mesurée de la requête à l'envoi Discord
+        online_latencies = []
+        online_statuses = []
+        for login in logins:
+            helix.go_live(login)
+            sends = fake_discord.calls['send']
+            started = time.perf_counter()
+            status, _ = await post(session, callback_url, eventsub.stream_online(login))
+            online_statuses.append(status)
+            if await wait_for(lambda: fake_discord.calls['send'] > sends, args.timeout) is not None:
+                online_latencies.append(time.perf_counter() - started)
+        checks['online_204'] = all(status == 204 for status in online_statuses)
+        checks['online_alerts_sent'] = len(online_latencies) == len(logins)
+
+        # Twitch rejoue parfois un message : même identifiant, aucune nouvelle alerte
+        helix.go_offline(logins[0])
+        duplicate = eventsub.stream_offline(logins[0])
+        status_first, _ = await post(session, callback_url, duplicate)
+        await wait_for(lambda: fake_discord.calls['delete'] > 0, args.timeout)
+        deletes = fake_discord.calls['delete']
+        status_again, _ = await post(session, callback_url, duplicate)
+        checks['duplicate_204'] = status_first == 204 and status_again == 204
+        checks['duplicate_ignored'] = await wait_for(lambda: fake_discord.calls['delete'] > deletes, 0.5) is None
+
+        # stream.offline : chaque alerte est retirée
+        offline_latencies = []
+        for login in logins[1:]:
+            helix.go_offline(login)
+            deletes = fake_discord.calls['delete']
+            started = time.perf_counter()
+            await post(session, callback_url, eventsub.stream_offline(login))
+            if await wait_for(lambda: fake_discord.calls['delete'] > deletes, args.timeout) is not None:
+                offline_latencies.append(time.perf_counter() - started)
+        checks['offline_alerts_deleted'] = len(offline_latencies) == len(logins) - 1
+        checks['no_alert_left'] = await wait_for(lambda: fake_discord.live_messages == 0, args.timeout) is not None
+
+    def summary(latencies):
+        if not latencies:
+            return {'count': 0}
+        ordered = sorted(latencies)
+        return {
+            'count': len(ordered),
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+            'max_ms': round(ordered[-1] * 1000, 1)
+        }
+
+    return {
+        'checks': checks,
+        'online_to_alert': summary(online_latencies),
+        'offline_to_delete': summary(offline_latencies),
+        'helix_requests': dict(helix.requests),
+        'discord_calls': dict(fake_discord.calls)
+    }
+
+async def main(args):
+    helix = FakeHelix(max(args.streamers, 1), 0, args.helix_latency)
+    await helix.start()
+    helix.install()
+
+    # bot.py lit sa configuration à l'import ; le callback est servi sur un port local
+    app = web.Application()
+    runner = web.AppRunner(app, access_log=None)
+    os.environ.update({
+        'TWITCH_CLIENT_ID': 'bench', 'TWITCH_CLIENT_SECRET': 'bench',
+        'TWITCH_EVENTSUB_SECRET': SECRET, 'TWITCH_EVENTSUB_CALLBACK': 'http://127.0.0.1/eventsub',
+        'STATE_DB_PATH': ':memory:'
+    })
+    logging.basicConfig(level=logging.WARNING)
+    import bot
+
+    app.router.add_post('/eventsub', bot.eventsub_callback)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    callback_url = f"http://127.0.0.1:{runner.addresses[0][1]}/eventsub"
+
+    fake_discord = FakeDiscord(args.discord_latency)
+    fake_discord.install(bot.bot)
+    await bot.twitch_api.refresh_token()
+    try:
+        report = await run(bot, args, helix, fake_discord, callback_url)
+    finally:
+        await runner.cleanup()
+        await bot.twitch_api.close()
+        await helix.stop()
+    report['ok'] = all(report['checks'].values())
+    return report
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"✅ Rapport écrit dans {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    if not report['ok']:
+        failed = [name for name, passed in report['checks'].items() if not passed]
+        print(f"❌ Vérification(s) en échec: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
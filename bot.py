@@ -6,13 +6,28 @@ from discord import app_commands
 import aiohttp
 import asyncio
 import os
+import sys
 import json
+import csv
+import re
+import heapq
+import bisect
+import sqlite3
 import logging
+import logging.handlers
+import queue
+import copy
+import time
+import hmac
+import hashlib
+from collections import OrderedDict, namedtuple, deque
+from types import MappingProxyType
 from datetime import datetime, UTC, timedelta
-from threading import Thread
+from threading import Thread, get_ident
 from aiohttp import web
 import pytz
 from typing import Optional
+from contextlib import contextmanager
 
 # === CONFIG ===
 intents = discord.Intents.default()
@@ -36,6 +51,366 @@ def format_date(date):
     days = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
     return f"{days[date.weekday()]} {date.day} {months[date.month - 1]} {date.year} à {date.strftime('%H:%M')}"
 
+# === JOURNALISATION ===
+# Les boucles chaudes journalisent via une file : l'écriture sur stdout se fait dans un thread,
+# jamais sur la boucle asyncio. Les lignes répétitives (une par stream et par tick) sont échantillonnées.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()   # text | json
+LOG_SAMPLE_SECONDS = float(os.getenv("LOG_SAMPLE_SECONDS", 300))
+LOG_FIELDS = ('channel', 'streamer', 'event_id', 'action', 'count', 'duration_ms', 'status', 'suppressed')
+
+log = logging.getLogger("alpine")
+log_listener = None
+
+class JsonLogFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, avec les champs structurés passés via extra="""
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, TIMEZONE).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for field in LOG_FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class TextLogFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            line += f" (+{record.suppressed} similaire(s) ignorée(s))"
+        return line
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui garde le traceback à part du message.
+    
+    L'implémentation standard l'intègre au texte et vide exc_info : le champ 'exc' du format
+    JSON n'était jamais écrit. Le traceback est mis en forme ici (les frames ne traversent pas
+    la file), puis placé par le formateur du listener."""
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class LogSampler(logging.Filter):
+    """Au plus une ligne par `sample_key` et par fenêtre ; les suivantes sont comptées puis signalées"""
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self.seen = {}  # clé -> [premier passage de la fenêtre, lignes ignorées]
+
+    def filter(self, record):
+        key = getattr(record, 'sample_key', None)
+        if key is None or self.window <= 0:
+            return True
+        now = time.monotonic()
+        entry = self.seen.get(key)
+        if entry is not None and now - entry[0] < self.window:
+            entry[1] += 1
+            return False
+        if entry is not None and entry[1]:
+            record.suppressed = entry[1]
+        self.seen[key] = [now, 0]
+        if len(self.seen) > 10000:
+            self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.window}
+        return True
+
+def setup_logging():
+    """Racine -> QueueHandler (échantillonnage) -> QueueListener -> stdout dans un thread dédié"""
+    global log_listener
+    if log_listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(JsonLogFormatter())
+    else:
+        stream_handler.setFormatter(TextLogFormatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%H:%M:%S"))
+    queue_handler = StructuredQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(LogSampler(LOG_SAMPLE_SECONDS))
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    log_listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    log_listener.start()
+
+def stop_logging():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+# === MÉTRIQUES (format Prometheus) ===
+# Exposition texte minimale, sans dépendance : compteurs, histogrammes et jauges calculées au scrape
+METRICS_DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class MetricsRegistry:
+    def __init__(self):
+        self.meta = {}        # nom -> (type, aide, buckets)
+        self.counters = {}    # (nom, labels) -> valeur
+        self.histograms = {}  # (nom, labels) -> [compte par bucket, somme, total]
+        self.gauges = {}      # nom -> fonction renvoyant la valeur courante
+
+    def counter(self, name, help_text):
+        self.meta[name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=METRICS_DEFAULT_BUCKETS):
+        self.meta[name] = ('histogram', help_text, buckets)
+
+    def gauge(self, name, help_text, function):
+        self.meta[name] = ('gauge', help_text, None)
+        self.gauges[name] = function
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self.meta[name][2]
+        series = self.histograms.get(key)
+        if series is None:
+            series = self.histograms[key] = [[0] * len(buckets), 0.0, 0]
+        index = bisect.bisect_left(buckets, value)
+        if index < len(buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, buckets) in self.meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'gauge':
+                try:
+                    lines.append(f"{name} {self.gauges[name]()}")
+                except Exception:
+                    pass
+            elif kind == 'counter':
+                for (series_name, labels), value in self.counters.items():
+                    if series_name == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+            else:
+                for (series_name, labels), (counts, total_sum, count) in self.histograms.items():
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{self._labels(labels)} {round(total_sum, 6)}")
+                    lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.histogram('bot_loop_duration_seconds', "Durée d'une itération des boucles de fond")
+metrics.histogram('twitch_helix_request_duration_seconds', "Latence des requêtes Helix")
+metrics.counter('twitch_helix_requests_total', "Requêtes Helix par endpoint et code HTTP")
+metrics.counter('discord_operations_total', "Envois / éditions / suppressions Discord par résultat")
+metrics.counter('discord_rate_limited_total', "429 reçus de Discord, globaux compris (journal discord.http)")
+metrics.counter('discord_global_rate_limited_total', "Limites globales Discord atteintes (journal discord.http)")
+metrics.histogram('bot_notification_lag_seconds', "Retard de livraison des notifications",
+                  buckets=(0.5, 1, 2, 5, 10, 30, 60, 120, 300, 900))
+metrics.gauge('bot_events', "Événements en mémoire", lambda: len(events))
+metrics.gauge('bot_stream_messages', "Alertes live publiées", lambda: len(stream_messages))
+metrics.gauge('bot_streamers', "Streamers suivis (tous salons)", lambda: bot_stats.streamers_total)
+metrics.gauge('bot_uptime_seconds', "Temps écoulé depuis le démarrage", lambda: bot_stats.uptime_seconds())
+metrics.gauge('discord_dispatch_pending', "Opérations Discord en attente", lambda: discord_dispatcher.pending_count())
+
+class DiscordRateLimitFilter(logging.Filter):
+    """discord.py gère lui-même les 429 et ne les remonte qu'à travers son journal.
+    Un 429 global produit deux lignes (« responded with 429 » puis « Global rate limit ») :
+    la première compte tous les 429, la seconde seulement les limites globales."""
+    def filter(self, record):
+        message = str(record.msg)
+        if 'responded with 429' in message:
+            metrics.inc('discord_rate_limited_total')
+        elif 'Global rate limit' in message:
+            metrics.inc('discord_global_rate_limited_total')
+        return True
+
+logging.getLogger('discord.http').addFilter(DiscordRateLimitFilter())
+
+# === STATISTIQUES ===
+# Compteurs tenus à jour aux mutations : les vues de statut (health, debug, notification-status)
+# les lisent sans parcourir l'état, et les endpoints de santé servent un corps mis en cache
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", 5))
+
+class BotStats:
+    def __init__(self):
+        self.started_at = datetime.now(TIMEZONE)
+        self.started_monotonic = time.monotonic()
+        self.streamers_by_channel = {}  # channel_id -> nombre de streamers suivis
+        self.streamers_total = 0
+        self.loops = {}                 # nom -> {'runs', 'errors', 'last_run', 'last_duration_s'}
+        self.cached_bodies = {}         # route -> (expiration, corps)
+
+    def uptime_seconds(self):
+        return int(time.monotonic() - self.started_monotonic)
+
+    def uptime_text(self):
+        minutes, seconds = divmod(self.uptime_seconds(), 60)
+        hours, minutes = divmod(minutes, 60)
+        days, hours = divmod(hours, 24)
+        return f"{days}j {hours}h {minutes}min" if days else f"{hours}h {minutes}min {seconds}s"
+
+    def set_streamer_count(self, channel_id, count):
+        previous = self.streamers_by_channel.pop(channel_id, 0)
+        if count:
+            self.streamers_by_channel[channel_id] = count
+        self.streamers_total += count - previous
+
+    @contextmanager
+    def track_loop(self, name):
+        """Mesurer une itération de tâche de fond : dernière exécution, durée et erreurs"""
+        loop = self.loops.setdefault(name, {'runs': 0, 'errors': 0, 'last_run': None, 'last_duration_s': None})
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            loop['errors'] += 1
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            loop['runs'] += 1
+            loop['last_run'] = datetime.now(TIMEZONE).isoformat()
+            loop['last_duration_s'] = round(duration, 4)
+            metrics.observe('bot_loop_duration_seconds', duration, loop=name)
+
+    def cached_body(self, route, builder):
+        """Corps de réponse reconstruit au plus une fois toutes les HEALTH_CACHE_SECONDS"""
+        now = time.monotonic()
+        cached = self.cached_bodies.get(route)
+        if cached is None or cached[0] <= now:
+            cached = self.cached_bodies[route] = (now + HEALTH_CACHE_SECONDS, builder())
+        return cached[1]
+
+bot_stats = BotStats()
+
+# === SURVEILLANCE DE LA BOUCLE ASYNCIO ===
+# Gateway, tâches de fond, serveur web et commandes partagent une seule boucle : une sonde mesure
+# son retard d'ordonnancement et un thread de garde capture la pile du code qui la bloque
+LOOP_PROBE_INTERVAL = float(os.getenv("LOOP_PROBE_INTERVAL", 0.5))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.5))
+LOOP_STACK_DEPTH = 12
+
+metrics.histogram('bot_event_loop_lag_seconds', "Retard d'ordonnancement de la boucle asyncio",
+                  buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+metrics.counter('bot_event_loop_blocked_total', "Blocages de la boucle au-delà du seuil")
+
+class LoopMonitor:
+    def __init__(self):
+        self.lag_samples = deque(maxlen=240)
+        self.max_lag = 0.0
+        self.heartbeat = None      # perf_counter du dernier passage de la sonde
+        self.loop_thread_id = None
+        self.blocks = deque(maxlen=20)  # {'at', 'blocked_s', 'where', 'stack'}
+        self.blocked_count = 0
+        self.probe_task = None
+        self.watchdog = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.loop_thread_id = get_ident()
+        self.probe_task = asyncio.create_task(self._probe())
+        self.watchdog = Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.watchdog.start()
+
+    def stop(self):
+        self.running = False
+        if self.probe_task is not None:
+            self.probe_task.cancel()
+            self.probe_task = None
+
+    async def _probe(self):
+        while self.running:
+            self.heartbeat = time.perf_counter()
+            await asyncio.sleep(LOOP_PROBE_INTERVAL)
+            lag = max(time.perf_counter() - self.heartbeat - LOOP_PROBE_INTERVAL, 0.0)
+            self.lag_samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            metrics.observe('bot_event_loop_lag_seconds', lag)
+
+    def _watch(self):
+        """Thread de garde : la boucle ne peut pas s'observer elle-même pendant qu'elle est bloquée"""
+        import traceback
+        reported = None  # heartbeat du blocage en cours, déjà enregistré
+        while self.running:
+            time.sleep(LOOP_BLOCK_THRESHOLD / 2)
+            heartbeat = self.heartbeat
+            if heartbeat is None:
+                continue
+            blocked = time.perf_counter() - heartbeat - LOOP_PROBE_INTERVAL
+            if blocked < LOOP_BLOCK_THRESHOLD:
+                continue
+            if reported == heartbeat:
+                self.blocks[-1]['blocked_s'] = round(blocked, 3)
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)[-LOOP_STACK_DEPTH:]
+            where = f"{os.path.basename(stack[-1].filename)}:{stack[-1].lineno} ({stack[-1].name})" if stack else "?"
+            self.blocks.append({
+                'at': datetime.now(TIMEZONE).isoformat(),
+                'blocked_s': round(blocked, 3),
+                'where': where,
+                'stack': "".join(traceback.format_list(stack))
+            })
+            self.blocked_count += 1
+            metrics.inc('bot_event_loop_blocked_total')
+            reported = heartbeat
+            log.warning("⚠️ Boucle asyncio bloquée depuis %.2fs : %s", blocked, where,
+                        extra={'duration_ms': round(blocked * 1000)})
+
+    def summary(self, with_stack=False):
+        data = {'running': self.running, 'blocked_count': self.blocked_count, 'max_lag_s': round(self.max_lag, 3)}
+        if self.lag_samples:
+            ordered = sorted(self.lag_samples)
+            data['last_lag_s'] = round(self.lag_samples[-1], 4)
+            data['avg_lag_s'] = round(sum(ordered) / len(ordered), 4)
+            data['p95_lag_s'] = round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4)
+        if self.blocks:
+            last_block = dict(self.blocks[-1])
+            if not with_stack:
+                last_block.pop('stack')
+            data['last_block'] = last_block
+        return data
+
+loop_monitor = LoopMonitor()
+
 # === SERVEUR WEB AMÉLIORÉ ===
 web_runner = None
 web_site = None
@@ -45,41 +420,18 @@ async def start_web_server():
     global web_runner, web_site
     
     try:
-        async def health_check(request):
-            """Endpoint de santé avec informations détaillées"""
+        def build_health_text():
             bot_status = "✅ CONNECTÉ" if bot.is_ready() else "❌ DÉCONNECTÉ"
             notif_status = "✅ ACTIF" if notification_system.is_running() else "❌ ARRÊTÉ"
             twitch_status = "✅ ACTIF" if check_streams.is_running() else "❌ ARRÊTÉ"
-            
-            health_data = {
-                "status": "healthy",
-                "timestamp": datetime.now(TIMEZONE).isoformat(),
-                "bot": {
-                    "connected": bot.is_ready(),
-                    "status": bot_status,
-                    "latency": f"{round(bot.latency * 1000)}ms" if bot.is_ready() else "N/A",
-                    "guilds": len(bot.guilds) if bot.is_ready() else 0
-                },
-                "services": {
-                    "notifications": notif_status,
-                    "twitch": twitch_status,
-                    "events_count": len(events),
-                    "streamers_count": sum(len(s) for s in streamers.values())
-                }
-            }
-            
-            return web.Response(
-                text=f"🤖 Bot Discord Alpine - Status: {bot_status}\n"
-                     f"🔔 Notifications: {notif_status}\n"
-                     f"📺 Twitch: {twitch_status}\n"
-                     f"⏰ {datetime.now(TIMEZONE).strftime('%d/%m/%Y %H:%M:%S')} (Paris)\n"
-                     f"📊 {len(events)} événements, {sum(len(s) for s in streamers.values())} streamers",
-                status=200,
-                headers={'Content-Type': 'text/plain; charset=utf-8'}
-            )
+            return (f"🤖 Bot Discord Alpine - Status: {bot_status}\n"
+                    f"🔔 Notifications: {notif_status}\n"
+                    f"📺 Twitch: {twitch_status}\n"
+                    f"⏰ {datetime.now(TIMEZONE).strftime('%d/%m/%Y %H:%M:%S')} (Paris)\n"
+                    f"⏱️ En ligne depuis {bot_stats.uptime_text()}\n"
+                    f"📊 {len(events)} événements, {bot_stats.streamers_total} streamers")
         
-        async def health_json(request):
-            """Endpoint JSON pour monitoring avancé"""
+        def build_health_json():
             bot_status = bot.is_ready()
             notif_status = notification_system.is_running()
             twitch_status = check_streams.is_running()
@@ -96,13 +448,39 @@ async def start_web_server():
                     "notifications_running": notif_status,
                     "twitch_running": twitch_status,
                     "events_count": len(events),
-                    "streamers_count": sum(len(s) for s in streamers.values()),
+                    "streamers_count": bot_stats.streamers_total,
                     "active_streams": len(stream_messages)
                 },
-                "uptime": "running"  # Vous pouvez ajouter un vrai uptime si nécessaire
+                "loops": bot_stats.loops,
+                "twitch_api": {
+                    "last_tick": twitch_api.last_tick_stats,
+                    "ratelimit_limit": twitch_api.ratelimit_limit,
+                    "ratelimit_remaining": twitch_api.ratelimit_remaining,
+                    "user_cache": twitch_api.user_cache.stats(),
+                    "poll_tiers": poll_scheduler.last_plan
+                },
+                "event_loop": loop_monitor.summary(with_stack=True),
+                "started_at": bot_stats.started_at.isoformat(),
+                "uptime_seconds": bot_stats.uptime_seconds(),
+                "uptime": bot_stats.uptime_text()
             }
-            
-            return web.json_response(health_data)
+            return json.dumps(health_data, default=str)
+        
+        async def health_check(request):
+            """Endpoint de santé (texte, corps en cache)"""
+            return web.Response(
+                text=bot_stats.cached_body('health', build_health_text),
+                status=200,
+                headers={'Content-Type': 'text/plain; charset=utf-8'}
+            )
+        
+        async def health_json(request):
+            """Endpoint JSON pour monitoring avancé (corps en cache)"""
+            return web.Response(text=bot_stats.cached_body('health.json', build_health_json), content_type='application/json')
+        
+        async def metrics_endpoint(request):
+            """Métriques au format texte Prometheus"""
+            return web.Response(text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
         
         async def ping(request):
             """Simple endpoint ping"""
@@ -116,7 +494,10 @@ async def start_web_server():
         app.router.add_get('/health', health_check)
         app.router.add_get('/health.json', health_json)
         app.router.add_get('/ping', ping)
+        app.router.add_get('/metrics', metrics_endpoint)
         app.router.add_get('/status', health_check)
+        if EVENTSUB_ENABLED:
+            app.router.add_post('/eventsub', eventsub_callback)
         
         # Configuration du serveur
         port = int(os.getenv('PORT', 8080))
@@ -134,6 +515,9 @@ async def start_web_server():
         print(f"   - Health check: http://{host}:{port}/health")
         print(f"   - JSON status: http://{host}:{port}/health.json")
         print(f"   - Ping: http://{host}:{port}/ping")
+        print(f"   - Métriques: http://{host}:{port}/metrics")
+        if EVENTSUB_ENABLED:
+            print(f"   - EventSub: http://{host}:{port}/eventsub")
         
         return True
         
@@ -161,66 +545,617 @@ async def stop_web_server():
     except Exception as e:
         print(f"⚠️ Erreur lors de l'arrêt du serveur web: {e}")
 
+# === FILE D'ENVOI DISCORD ===
+# Une file par salon, traitée un appel à la fois : c'est la seule borne de concurrence.
+# discord.py applique lui-même les buckets par route et la limite globale ; un salon qui
+# attend la fin d'un 429 ne retient donc aucun créneau partagé avec les autres salons
+
+class DiscordDispatcher:
+    """Point de passage unique des envois, éditions et suppressions de messages"""
+    def __init__(self):
+        self.queues = {}   # channel_id -> OrderedDict(clé d'opération -> opération)
+        self.workers = {}  # channel_id -> tâche de traitement
+        self.sequence = 0
+        self.stats = {'send': 0, 'edit': 0, 'delete': 0, 'bulk_delete': 0, 'bulk_deleted': 0,
+                      'coalesced': 0, 'cancelled': 0, 'errors': 0}
+
+    def pending_count(self):
+        return sum(len(channel_ops) for channel_ops in self.queues.values())
+
+    def send(self, channel, **kwargs):
+        """Programmer un envoi ; renvoie un future résolu avec le message envoyé"""
+        self.sequence += 1
+        return self._enqueue(channel.id, ('send', self.sequence), 'send', channel, kwargs)
+
+    def edit(self, message, **kwargs):
+        """Programmer une édition ; seule la dernière édition en attente d'un message est envoyée"""
+        channel_ops = self.queues.get(message.channel.id)
+        op_key = ('edit', message.id)
+        if channel_ops is not None and op_key in channel_ops and not channel_ops[op_key]['future'].done():
+            channel_ops[op_key]['kwargs'] = kwargs
+            self.stats['coalesced'] += 1
+            return channel_ops[op_key]['future']
+        return self._enqueue(message.channel.id, op_key, 'edit', message, kwargs)
+
+    def _cancel_edit(self, channel_ops, message_id):
+        pending_edit = channel_ops.pop(('edit', message_id), None)
+        if pending_edit and not pending_edit['future'].done():
+            pending_edit['future'].set_result(None)
+            self.stats['cancelled'] += 1
+
+    def delete(self, message):
+        """Programmer une suppression ; annule les éditions en attente du même message"""
+        channel_ops = self.queues.get(message.channel.id)
+        if channel_ops is not None:
+            self._cancel_edit(channel_ops, message.id)
+            pending_delete = channel_ops.get(('delete', message.id))
+            if pending_delete and not pending_delete['future'].done():
+                return pending_delete['future']
+        return self._enqueue(message.channel.id, ('delete', message.id), 'delete', message, {})
+
+    def bulk_delete(self, channel_id, message_ids):
+        """Programmer la suppression de plusieurs messages d'un même salon en un minimum d'appels"""
+        channel_ops = self.queues.get(channel_id)
+        if channel_ops is not None:
+            for message_id in message_ids:
+                self._cancel_edit(channel_ops, message_id)
+        self.sequence += 1
+        return self._enqueue(channel_id, ('bulk_delete', self.sequence), 'bulk_delete', channel_id,
+                             {'message_ids': list(message_ids)})
+
+    def _enqueue(self, channel_id, op_key, kind, target, kwargs):
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(self._log_failure)
+        channel_ops = self.queues.setdefault(channel_id, OrderedDict())
+        channel_ops[op_key] = {'kind': kind, 'target': target, 'kwargs': kwargs, 'future': future}
+        worker = self.workers.get(channel_id)
+        if worker is None or worker.done():
+            self.workers[channel_id] = asyncio.create_task(self._worker(channel_id))
+        return future
+
+    @staticmethod
+    def _log_failure(future):
+        # Les appels « fire and forget » ne lisent jamais le résultat : on journalise ici
+        if not future.cancelled() and future.exception() is not None:
+            log.error("❌ Erreur envoi Discord: %s", future.exception())
+
+    async def _worker(self, channel_id):
+        channel_ops = self.queues[channel_id]
+        try:
+            while channel_ops:
+                _, op = channel_ops.popitem(last=False)
+                future = op['future']
+                if future.done():
+                    continue
+                try:
+                    result = await self._execute(op)
+                    metrics.inc('discord_operations_total', kind=op['kind'], result='ok')
+                    if not future.done():
+                        future.set_result(result)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    metrics.inc('discord_operations_total', kind=op['kind'], result='error')
+                    if not future.done():
+                        future.set_exception(e)
+        finally:
+            if not channel_ops:
+                self.queues.pop(channel_id, None)
+            self.workers.pop(channel_id, None)
+
+    async def _execute(self, op):
+        kind, target, kwargs = op['kind'], op['target'], op['kwargs']
+        self.stats[kind] += 1
+        if kind == 'send':
+            return await target.send(**kwargs)
+        if kind == 'edit':
+            return await target.edit(**kwargs)
+        if kind == 'bulk_delete':
+            return await self._bulk_delete(target, kwargs['message_ids'])
+        try:
+            await target.delete()
+        except discord.NotFound:
+            pass  # Message déjà supprimé
+        return None
+
+    async def _bulk_delete(self, channel_id, message_ids):
+        # La suppression groupée exige 2 à 100 messages de moins de 14 jours et la permission
+        # « Gérer les messages » ; le reste est supprimé un par un
+        channel = bot.get_channel(channel_id)
+        cutoff = datetime.now(UTC) - timedelta(days=13, hours=23)
+        recent = [message_id for message_id in message_ids if discord.utils.snowflake_time(message_id) > cutoff]
+        single = [message_id for message_id in message_ids if discord.utils.snowflake_time(message_id) <= cutoff]
+        can_bulk = (channel is not None and hasattr(channel, 'delete_messages')
+                    and channel.permissions_for(channel.guild.me).manage_messages)
+        for i in range(0, len(recent), 100):
+            chunk = recent[i:i + 100]
+            if not can_bulk or len(chunk) < 2:
+                single.extend(chunk)
+                continue
+            try:
+                await channel.delete_messages([discord.Object(id=message_id) for message_id in chunk])
+                self.stats['bulk_deleted'] += len(chunk)
+            except discord.HTTPException:
+                single.extend(chunk)
+        for message_id in single:
+            try:
+                await partial_message(channel_id, message_id).delete()
+            except discord.NotFound:
+                pass  # Message déjà supprimé
+        return None
+
+    def close(self):
+        """Annuler les traitements en cours (arrêt du bot)"""
+        for worker in list(self.workers.values()):
+            worker.cancel()
+        for channel_ops in self.queues.values():
+            for op in channel_ops.values():
+                op['future'].cancel()
+        self.queues.clear()
+        self.workers.clear()
+
+discord_dispatcher = DiscordDispatcher()
+
+# Limites Discord par message : 10 embeds et 6000 caractères cumulés
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_EMBED_CHARS = 6000
+
+def chunk_embeds(items, sizes):
+    """Découper des éléments en lots qui respectent les deux limites (sizes = len() de chaque embed)"""
+    chunk = []
+    total = 0
+    for item, size in zip(items, sizes):
+        if chunk and (len(chunk) >= DISCORD_MAX_EMBEDS or total + size > DISCORD_MAX_EMBED_CHARS):
+            yield chunk
+            chunk = []
+            total = 0
+        chunk.append(item)
+        total += size
+    if chunk:
+        yield chunk
+
+# === RENDU DES EMBEDS ===
+# Les embeds sont rendus une fois par version de leur source (événement, stream) ;
+# seuls le pied de page et l'horodatage, propres à chaque envoi, sont posés à chaque appel
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 2000))
+
+class EmbedRenderCache:
+    """Cache LRU des embeds pré-rendus (format dict Discord), invalidé par changement de version"""
+    def __init__(self, max_size):
+        self.entries = OrderedDict()  # clé -> (version, payload)
+        self.max_size = max_size
+        self.stats = {'hits': 0, 'renders': 0}
+
+    def render(self, key, version, builder):
+        """Renvoyer un embed neuf construit depuis le rendu en cache ; builder() n'est appelé que si la version change"""
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            payload = entry[1]
+        else:
+            payload = builder().to_dict()
+            self.entries[key] = (version, payload)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.stats['renders'] += 1
+        # from_dict réutilise la liste des champs : copie pour que l'appelant puisse la modifier
+        return discord.Embed.from_dict({**payload, 'fields': [dict(field) for field in payload.get('fields', ())]})
+
+embed_cache = EmbedRenderCache(EMBED_CACHE_SIZE)
+
 # === TWITCH ===
 TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
+# Surchargeables (proxy, faux serveur) ; bench/ redirige aussi les URL par défaut au niveau d'aiohttp
+TWITCH_API_BASE = os.getenv("TWITCH_API_BASE", "https://api.twitch.tv/helix").rstrip('/')
+TWITCH_AUTH_URL = os.getenv("TWITCH_AUTH_URL", "https://id.twitch.tv/oauth2/token")
 streamers = {}
 stream_messages = {}
 currently_live_streamers = {}
+stream_channel_locks = {}
+
+# Instantané immuable publié par le poller : login -> StreamStatus
+StreamStatus = namedtuple('StreamStatus', ['stream', 'checked_at'])
+live_snapshot = MappingProxyType({})
+# Âge minimal toléré ; chaque login tolère en plus l'intervalle de son palier de polling
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", 180))
+
+def publish_stream_snapshot(checked_logins, live_now, followed=None):
+    """Publier une nouvelle version de l'instantané (les lecteurs gardent l'ancienne intacte)"""
+    global live_snapshot
+    checked_at = datetime.now(UTC).timestamp()
+    updated = dict(live_snapshot)
+    if followed is not None:
+        for username in [u for u in updated if u not in followed]:
+            del updated[username]
+    for username in checked_logins:
+        updated[username] = StreamStatus(live_now.get(username), checked_at)
+    live_snapshot = MappingProxyType(updated)
 ping_roles = {}
 reaction_role_messages = {}
 
+# EventSub (webhook) : alertes instantanées, le polling ne sert plus qu'à la réconciliation
+TWITCH_EVENTSUB_SECRET = os.getenv("TWITCH_EVENTSUB_SECRET")
+TWITCH_EVENTSUB_CALLBACK = os.getenv("TWITCH_EVENTSUB_CALLBACK")  # ex: https://mon-bot.onrender.com/eventsub
+EVENTSUB_ENABLED = bool(TWITCH_EVENTSUB_SECRET and TWITCH_EVENTSUB_CALLBACK)
+EVENTSUB_RECONCILE_MINUTES = int(os.getenv("EVENTSUB_RECONCILE_MINUTES", 15))
+
+# Pool HTTP partagé avec Twitch (keep-alive + cache DNS)
+TWITCH_HTTP_POOL_LIMIT = int(os.getenv("TWITCH_HTTP_POOL_LIMIT", 20))
+TWITCH_HTTP_TIMEOUT = float(os.getenv("TWITCH_HTTP_TIMEOUT", 10))
+TWITCH_DNS_CACHE_TTL = int(os.getenv("TWITCH_DNS_CACHE_TTL", 300))
+TWITCH_KEEPALIVE_TIMEOUT = float(os.getenv("TWITCH_KEEPALIVE_TIMEOUT", 60))
+# Lots de 100 logins récupérés en parallèle, en gardant une marge sur le quota Helix
+TWITCH_MAX_CONCURRENT_BATCHES = int(os.getenv("TWITCH_MAX_CONCURRENT_BATCHES", 4))
+TWITCH_RATELIMIT_MARGIN = int(os.getenv("TWITCH_RATELIMIT_MARGIN", 20))
+# Cache login -> identifiant Twitch (les logins introuvables sont mémorisés moins longtemps)
+TWITCH_USER_CACHE_SIZE = int(os.getenv("TWITCH_USER_CACHE_SIZE", 10000))
+TWITCH_USER_CACHE_TTL = int(os.getenv("TWITCH_USER_CACHE_TTL", 24 * 3600))
+TWITCH_USER_NEGATIVE_TTL = int(os.getenv("TWITCH_USER_NEGATIVE_TTL", 3600))
+
+class TwitchUserCache:
+    """Cache LRU/TTL login -> identifiant Twitch, avec compteurs hit/miss"""
+    def __init__(self, max_size, ttl, negative_ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()  # login -> (user_id ou None, expire_at)
+        self.hits = 0
+        self.misses = 0
+        self.renamed = 0
+
+    def get(self, login, now):
+        """Renvoie (trouvé, user_id) ; user_id vaut None pour un login introuvable"""
+        entry = self.entries.get(login)
+        if entry is None or entry[1] <= now:
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(login)
+        self.hits += 1
+        return True, entry[0]
+
+    def stale_id(self, login):
+        """Dernier identifiant connu, même expiré"""
+        entry = self.entries.get(login)
+        return entry[0] if entry else None
+
+    def put(self, login, user_id, now):
+        ttl = self.ttl if user_id else self.negative_ttl
+        self.entries[login] = (user_id, now + ttl)
+        self.entries.move_to_end(login)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def logins_for_id(self, user_id):
+        return [login for login, (cached_id, _) in self.entries.items() if cached_id == user_id]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+            'unresolved': sum(1 for user_id, _ in self.entries.values() if user_id is None),
+            'renamed': self.renamed
+        }
+
 class TwitchAPI:
     def __init__(self):
         self.token = None
         self.headers = {}
         self.token_expires_at = None
+        self.session = None
+        self.refresh_task = None
+        # Quota Helix (en-têtes Ratelimit-*)
+        self.ratelimit_limit = None
+        self.ratelimit_remaining = None
+        self.ratelimit_reset = None
+        # Dernières valeurs renvoyées par Twitch (ratelimit_remaining est décrémenté localement)
+        self.seen_remaining = None
+        self.seen_reset = None
+        self.tick_stats = self._new_tick_stats()
+        self.last_tick_stats = None
+        self.user_cache = TwitchUserCache(TWITCH_USER_CACHE_SIZE, TWITCH_USER_CACHE_TTL, TWITCH_USER_NEGATIVE_TTL)
+
+    def get_session(self):
+        """Session aiohttp unique, créée à la demande et réutilisée pendant toute la vie du bot"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=TWITCH_HTTP_POOL_LIMIT,
+                ttl_dns_cache=TWITCH_DNS_CACHE_TTL,
+                keepalive_timeout=TWITCH_KEEPALIVE_TIMEOUT
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=TWITCH_HTTP_TIMEOUT)
+            )
+        return self.session
+
+    @staticmethod
+    def _new_tick_stats():
+        return {'requests': 0, 'points_used': 0, 'throttled': 0, 'rate_limited': 0, 'errors': 0}
+
+    def begin_tick(self):
+        """Remettre à zéro les compteurs de requêtes du tick courant"""
+        self.tick_stats = self._new_tick_stats()
+
+    def end_tick(self):
+        """Figer les compteurs du tick avec l'état du quota Helix"""
+        self.last_tick_stats = {
+            **self.tick_stats,
+            'ratelimit_limit': self.ratelimit_limit,
+            'ratelimit_remaining': self.ratelimit_remaining
+        }
+        return self.last_tick_stats
+
+    def _update_ratelimit(self, headers):
+        try:
+            if 'Ratelimit-Limit' in headers:
+                self.ratelimit_limit = int(headers['Ratelimit-Limit'])
+            if 'Ratelimit-Remaining' in headers:
+                remaining = int(headers['Ratelimit-Remaining'])
+                self._count_points(remaining)
+                self.ratelimit_remaining = remaining
+            if 'Ratelimit-Reset' in headers:
+                self.ratelimit_reset = int(headers['Ratelimit-Reset'])
+                self.seen_reset = self.ratelimit_reset
+        except ValueError:
+            pass
+
+    def _count_points(self, remaining):
+        """Points consommés d'après Ratelimit-Remaining, d'une réponse à la suivante"""
+        previous = self.seen_remaining
+        self.seen_remaining = remaining
+        if previous is not None and remaining <= previous:
+            self.tick_stats['points_used'] += previous - remaining
+        elif previous is not None and self.seen_reset is not None and self.ratelimit_limit \
+                and datetime.now(UTC).timestamp() >= self.seen_reset:
+            # Seau rempli depuis la réponse précédente : tout ce qui manque a été consommé depuis
+            self.tick_stats['points_used'] += max(self.ratelimit_limit - remaining, 0)
+        else:
+            # Première réponse, remplissage partiel ou réponses croisées : au moins le point de cette requête
+            self.tick_stats['points_used'] += 1
+
+    async def _wait_for_ratelimit(self):
+        """Ralentir AVANT d'atteindre la limite plutôt qu'après un 429"""
+        if self.ratelimit_remaining is None or self.ratelimit_reset is None:
+            return
+        if self.ratelimit_remaining <= TWITCH_RATELIMIT_MARGIN:
+            delay = self.ratelimit_reset - datetime.now(UTC).timestamp()
+            if delay > 0:
+                self.tick_stats['throttled'] += 1
+                log.warning("⏳ Quota Helix presque épuisé (%s restants), pause de %.1fs", self.ratelimit_remaining, delay,
+                            extra={'duration_ms': round(delay * 1000), 'sample_key': 'helix-throttle'})
+                await asyncio.sleep(delay)
+            # Le seau est rempli de nouveau après le reset
+            self.ratelimit_remaining = self.ratelimit_limit
+        # Réserver un point pour les requêtes envoyées en parallèle
+        if self.ratelimit_remaining is not None:
+            self.ratelimit_remaining -= 1
+
+    async def _request(self, method, url, **kwargs):
+        """Requête Helix avec gestion du quota ; renvoie le JSON ou None"""
+        retried_429 = False
+        retried_401 = False
+        while True:
+            await self._wait_for_ratelimit()
+            self.tick_stats['requests'] += 1
+            token_used = self.token
+            endpoint = url[len(TWITCH_API_BASE) + 1:] if url.startswith(TWITCH_API_BASE) else url
+            started = time.perf_counter()
+            try:
+                async with self.get_session().request(method, url, headers=self.headers, **kwargs) as response:
+                    metrics.observe('twitch_helix_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+                    metrics.inc('twitch_helix_requests_total', endpoint=endpoint, status=response.status)
+                    self._update_ratelimit(response.headers)
+                    if response.status == 429 and not retried_429:
+                        # Limite atteinte malgré tout : attendre le reset puis réessayer une fois
+                        retried_429 = True
+                        self.tick_stats['rate_limited'] += 1
+                        self.ratelimit_remaining = 0
+                        continue
+                    if response.status == 401 and not retried_401:
+                        # Token révoqué ou expiré : un renouvellement puis on rejoue la requête
+                        retried_401 = True
+                        await self.refresh_token(stale_token=token_used)
+                        continue
+                    if not 200 <= response.status < 300:
+                        self.tick_stats['errors'] += 1
+                        log.error("❌ Twitch %s %s: HTTP %s", method, url, response.status, extra={'status': response.status})
+                        return None
+                    if response.status == 204:
+                        return {}
+                    return await response.json()
+            except Exception as e:
+                self.tick_stats['errors'] += 1
+                metrics.inc('twitch_helix_requests_total', endpoint=endpoint, status='error')
+                log.error("❌ Erreur requête Twitch %s: %s", url, e)
+                return None
+
+    async def close(self):
+        """Fermer proprement la session HTTP"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
 
     async def get_token(self):
         if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
             print("⚠️ Variables Twitch manquantes, fonctionnalités Twitch désactivées")
             return
-        url = "https://id.twitch.tv/oauth2/token"
+        url = TWITCH_AUTH_URL
         params = {
             'client_id': TWITCH_CLIENT_ID,
             'client_secret': TWITCH_CLIENT_SECRET,
             'grant_type': 'client_credentials'
         }
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, params=params) as resp:
-                    data = await resp.json()
-                    self.token = data['access_token']
-                    self.token_expires_at = datetime.now(UTC).timestamp() + data['expires_in']
-                    self.headers = {
-                        'Client-ID': TWITCH_CLIENT_ID,
-                        'Authorization': f'Bearer {self.token}'
-                    }
+            async with self.get_session().post(url, params=params) as resp:
+                data = await resp.json()
+                self.token = data['access_token']
+                self.token_expires_at = datetime.now(UTC).timestamp() + data['expires_in']
+                self.headers = {
+                    'Client-ID': TWITCH_CLIENT_ID,
+                    'Authorization': f'Bearer {self.token}'
+                }
         except Exception as e:
-            print(f"❌ Erreur Twitch API: {e}")
+            log.error("❌ Erreur Twitch API: %s", e)
+
+    async def refresh_token(self, stale_token=None):
+        """Renouvellement « single-flight » : les appelants concurrents attendent le même appel"""
+        if stale_token is not None and self.token != stale_token:
+            return  # Déjà renouvelé par un autre appelant
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self.get_token())
+        await asyncio.shield(self.refresh_task)
+
+    def token_expires_in(self):
+        if not self.token or self.token_expires_at is None:
+            return 0
+        return self.token_expires_at - datetime.now(UTC).timestamp()
 
     async def ensure_valid_token(self):
-        if not self.token or datetime.now(UTC).timestamp() >= self.token_expires_at - 300:
-            await self.get_token()
+        if self.token_expires_in() <= 300:
+            await self.refresh_token()
 
-    async def get_streams(self, usernames):
+    async def _fetch_batches(self, url, param, values):
+        """Requêtes Helix par lots de 100 valeurs, en parallèle (borné).
+        
+        Retourne (éléments, valeurs des lots en échec) : un lot en échec ne doit pas
+        être confondu avec une réponse vide."""
+        semaphore = asyncio.Semaphore(TWITCH_MAX_CONCURRENT_BATCHES)
+        
+        async def fetch_batch(batch):
+            async with semaphore:
+                data = await self._request('GET', url, params={param: batch})
+                return data.get('data', []) if data is not None else None
+        
+        batches = [values[i:i+100] for i in range(0, len(values), 100)]
+        results = await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+        items = []
+        failed = []
+        for batch, batch_items in zip(batches, results):
+            if batch_items is None:
+                failed.extend(batch)
+            else:
+                items.extend(batch_items)
+        return items, failed
+
+    async def get_streams(self, user_ids):
+        """Streams en cours pour une liste d'identifiants Twitch (+ identifiants non vérifiés)"""
+        if not self.token:
+            return [], list(user_ids)
+        await self.ensure_valid_token()
+        return await self._fetch_batches(f"{TWITCH_API_BASE}/streams", 'user_id', user_ids)
+
+    async def get_users(self, usernames):
+        """Résoudre des logins en utilisateurs Twitch (login -> données helix/users, + logins en échec)"""
+        if not self.token:
+            return {}, list(usernames)
+        await self.ensure_valid_token()
+        users, failed = await self._fetch_batches(f"{TWITCH_API_BASE}/users", 'login', usernames)
+        return {user['login']: user for user in users}, failed
+
+    async def resolve_user_ids(self, usernames):
+        """login -> identifiant Twitch, via le cache puis helix/users pour les absents.
+        
+        Retourne (résolus, logins non résolus faute de réponse Helix) ; seuls les logins
+        absents d'une réponse réussie sont mémorisés comme introuvables."""
+        now = datetime.now(UTC).timestamp()
+        resolved = {}
+        unresolved = []
+        missing = []
+        for username in usernames:
+            found, user_id = self.user_cache.get(username, now)
+            if not found:
+                missing.append(username)
+            elif user_id:
+                resolved[username] = user_id
+        
+        if missing and not self.token:
+            unresolved.extend(missing)
+        elif missing:
+            users, failed = await self.get_users(missing)
+            failed = set(failed)
+            for username in missing:
+                if username in failed:
+                    # Lot en échec : ni cache négatif ni suppression, on réessaiera
+                    unresolved.append(username)
+                    continue
+                user = users.get(username)
+                if user:
+                    self.user_cache.put(username, user['id'], now)
+                    resolved[username] = user['id']
+                    continue
+                previous_id = self.user_cache.stale_id(username)
+                if previous_id:
+                    # Compte renommé : on continue à le suivre par son identifiant
+                    self.user_cache.renamed += 1
+                    self.user_cache.put(username, previous_id, now)
+                    resolved[username] = previous_id
+                    log.warning("⚠️ Login Twitch introuvable, suivi conservé par identifiant: %s (%s)", username, previous_id,
+                                extra={'streamer': username, 'sample_key': ('renamed', username)})
+                else:
+                    self.user_cache.put(username, None, now)
+        return resolved, unresolved
+
+    async def get_live_streams(self, usernames):
+        """Streams en live indexés par login suivi (polling par identifiant).
+        
+        Retourne (streams en live, logins non vérifiés) : un login non vérifié n'est
+        ni en live ni hors ligne, son état précédent doit être conservé."""
+        user_ids, unchecked = await self.resolve_user_ids(usernames)
+        if not user_ids:
+            return {}, unchecked
+        login_by_id = {}
+        for username, user_id in user_ids.items():
+            login_by_id.setdefault(user_id, []).append(username)
+        live_now = {}
+        streams, failed_ids = await self.get_streams(list(login_by_id))
+        for stream in streams:
+            for username in login_by_id.get(stream['user_id'], []):
+                live_now[username] = stream
+        for user_id in failed_ids:
+            unchecked.extend(login_by_id.get(user_id, []))
+        return live_now, unchecked
+
+    async def get_eventsub_subscriptions(self):
+        """Lister toutes les souscriptions EventSub de l'application (paginé)"""
         if not self.token:
             return []
         await self.ensure_valid_token()
-        url = "https://api.twitch.tv/helix/streams"
-        all_streams = []
-        for i in range(0, len(usernames), 100):
-            batch = usernames[i:i+100]
-            params = {'user_login': batch}
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, headers=self.headers, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            all_streams.extend(data['data'])
-            except Exception as e:
-                print(f"❌ Erreur lors de la récupération des streams: {e}")
-        return all_streams
+        url = f"{TWITCH_API_BASE}/eventsub/subscriptions"
+        subscriptions = []
+        cursor = None
+        while True:
+            params = {'after': cursor} if cursor else {}
+            data = await self._request('GET', url, params=params)
+            if not data:
+                break
+            subscriptions.extend(data.get('data', []))
+            cursor = data.get('pagination', {}).get('cursor')
+            if not cursor:
+                break
+        return subscriptions
+
+    async def create_eventsub_subscription(self, sub_type, broadcaster_id):
+        await self.ensure_valid_token()
+        payload = {
+            'type': sub_type,
+            'version': '1',
+            'condition': {'broadcaster_user_id': broadcaster_id},
+            'transport': {
+                'method': 'webhook',
+                'callback': TWITCH_EVENTSUB_CALLBACK,
+                'secret': TWITCH_EVENTSUB_SECRET
+            }
+        }
+        return await self._request('POST', f"{TWITCH_API_BASE}/eventsub/subscriptions", json=payload)
+
+    async def delete_eventsub_subscription(self, subscription_id):
+        await self.ensure_valid_token()
+        return await self._request('DELETE', f"{TWITCH_API_BASE}/eventsub/subscriptions", params={'id': subscription_id})
 
 twitch_api = TwitchAPI()
 
@@ -230,153 +1165,569 @@ def format_viewer_count(count):
         return f"{count//1000}k"
     return str(count)
 
-@tasks.loop(minutes=2)  # ✅ Confirmé : toutes les 2 minutes
+# Écart minimal de viewers pour justifier une édition de l'embed
+STREAM_VIEWER_MIN_CHANGE = int(os.getenv("STREAM_VIEWER_MIN_CHANGE", 10))
+
+def stream_fingerprint(stream):
+    """Empreinte des champs affichés dans l'embed (sans le pied de page « Dernière MàJ »)"""
+    return (
+        stream.get('user_name'),
+        stream.get('title'),
+        stream.get('game_name'),
+        format_viewer_count(stream.get('viewer_count', 0))
+    )
+
+def stream_needs_update(stored_msg, stream):
+    """Vrai si un champ significatif a changé depuis la dernière édition"""
+    previous = stored_msg.get('fingerprint')
+    if previous is None:
+        return True
+    fingerprint = stream_fingerprint(stream)
+    if fingerprint[:3] != tuple(previous[:3]):
+        return True
+    if fingerprint[3] == previous[3]:
+        return False
+    viewer_delta = abs(stream.get('viewer_count', 0) - stored_msg.get('viewer_count', 0))
+    return viewer_delta >= STREAM_VIEWER_MIN_CHANGE
+
+def render_stream_embed(stream):
+    embed = discord.Embed(
+        title=f"🔴 {stream['user_name']} est en live !",
+        description=stream['title'],
+        url=f"https://twitch.tv/{stream['user_login']}",
+        color=0x9146ff
+    )
+    
+    embed.add_field(
+        name="👥 Viewers", 
+        value=f"**{format_viewer_count(stream.get('viewer_count', 0))}** spectateurs", 
+        inline=True
+    )
+    
+    # Ajouter la catégorie/jeu si disponible
+    if stream.get('game_name'):
+        embed.add_field(
+            name="🎮 Jeu", 
+            value=stream['game_name'], 
+            inline=True
+        )
+    
+    thumbnail_url = stream.get('thumbnail_url', '').replace('{width}', '1280').replace('{height}', '720')
+    if thumbnail_url:
+        embed.set_image(url=thumbnail_url)
+    return embed
+
+def build_stream_embed(stream, footer_suffix):
+    """Embed d'alerte live, rendu une fois par version du stream pour tous les salons qui le suivent"""
+    embed = embed_cache.render(
+        ('stream', stream['user_login']),
+        (stream.get('id'), stream.get('started_at'), stream.get('thumbnail_url'), stream_fingerprint(stream)),
+        lambda: render_stream_embed(stream)
+    )
+    started_at = datetime.fromisoformat(stream['started_at'].replace('Z', '+00:00')).astimezone(TIMEZONE)
+    embed.set_footer(text=f"Stream commencé à {started_at.strftime('%H:%M')} • {footer_suffix}")
+    return embed
+
+# === POLLING ADAPTATIF ===
+# Chaque streamer a sa propre cadence selon son historique ; la boucle ne fait que
+# choisir, à chaque tick de base, les logins arrivés à échéance
+POLL_BASE_TICK_SECONDS = int(os.getenv("POLL_BASE_TICK_SECONDS", 60))
+# palier -> (intervalle en secondes, budget de requêtes Helix par tick)
+POLL_TIERS = {
+    'new': (0, int(os.getenv("POLL_NEW_BUDGET", 10))),
+    'live': (int(os.getenv("POLL_LIVE_INTERVAL", 120)), int(os.getenv("POLL_LIVE_BUDGET", 20))),
+    'hot': (int(os.getenv("POLL_HOT_INTERVAL", 60)), int(os.getenv("POLL_HOT_BUDGET", 20))),
+    'active': (int(os.getenv("POLL_ACTIVE_INTERVAL", 240)), int(os.getenv("POLL_ACTIVE_BUDGET", 10))),
+    'dormant': (int(os.getenv("POLL_DORMANT_INTERVAL", 900)), int(os.getenv("POLL_DORMANT_BUDGET", 5)))
+}
+POLL_ACTIVE_DAYS = 7         # live récemment -> palier "active"
+POLL_SCHEDULE_WEEKS = 4      # créneaux horaires mémorisés pour le palier "hot"
+
+def format_poll_interval(seconds):
+    return f"{seconds // 60} min" if seconds >= 60 else f"{seconds}s"
+
+class StreamerPollScheduler:
+    """Choisit quels logins interroger à chaque tick selon leur palier"""
+    def __init__(self):
+        self.history = {}  # login -> {'first_checked', 'last_checked', 'last_live', 'live', 'slots': {heure de la semaine: jour}}
+        self.last_plan = {}
+
+    @staticmethod
+    def _slot(moment):
+        local = moment.astimezone(TIMEZONE)
+        return local.weekday() * 24 + local.hour
+
+    def restore(self, username, entry):
+        # JSON : les créneaux horaires reviennent en clés texte
+        entry['slots'] = {int(slot): day for slot, day in entry.get('slots', {}).items()}
+        self.history[username] = entry
+
+    def max_age(self, username, now):
+        """Âge au-delà duquel l'instantané d'un login est en retard sur son propre palier"""
+        interval, _ = POLL_TIERS[self.tier(username, now)]
+        return max(SNAPSHOT_MAX_AGE, interval + POLL_BASE_TICK_SECONDS)
+
+    def tier(self, username, now):
+        entry = self.history.get(username)
+        if entry is None:
+            return 'new'
+        if entry['live']:
+            return 'live'
+        # "Habituellement en live maintenant" : ce créneau ou le suivant dans les dernières semaines
+        slot = self._slot(now)
+        today = now.toordinal()
+        for candidate in (slot, (slot + 1) % 168):
+            seen = entry['slots'].get(candidate)
+            if seen is not None and today - seen <= POLL_SCHEDULE_WEEKS * 7:
+                return 'hot'
+        # Sans historique suffisant, on ne classe pas encore le streamer comme dormant
+        last_seen = entry['last_live'] or entry['first_checked']
+        if now.timestamp() - last_seen <= POLL_ACTIVE_DAYS * 86400:
+            return 'active'
+        return 'dormant'
+
+    def due_logins(self, all_logins, now):
+        """Logins à interroger ce tick, les plus en retard d'abord, dans la limite du budget de chaque palier"""
+        followed = set(all_logins)
+        for username in [u for u in self.history if u not in followed]:
+            del self.history[username]
+            state_store.delete('poll_history', username)
+        
+        timestamp = now.timestamp()
+        by_tier = {tier: [] for tier in POLL_TIERS}
+        counts = {tier: 0 for tier in POLL_TIERS}
+        for username in all_logins:
+            tier = self.tier(username, now)
+            counts[tier] += 1
+            interval, _ = POLL_TIERS[tier]
+            entry = self.history.get(username)
+            overdue = timestamp - entry['last_checked'] - interval if entry else float('inf')
+            if overdue >= 0:
+                by_tier[tier].append((overdue, username))
+        
+        due = []
+        plan = {}
+        for tier, candidates in by_tier.items():
+            _, budget = POLL_TIERS[tier]
+            candidates.sort(reverse=True)
+            selected = [username for _, username in candidates[:budget * 100]]
+            due.extend(selected)
+            plan[tier] = {'followed': counts[tier], 'due': len(candidates), 'polled': len(selected)}
+        self.last_plan = plan
+        return due
+
+    def record(self, checked_logins, live_now, now):
+        timestamp = now.timestamp()
+        slot = self._slot(now)
+        today = now.toordinal()
+        for username in checked_logins:
+            entry = self.history.get(username)
+            changed = entry is None
+            if changed:
+                entry = self.history[username] = {
+                    'first_checked': timestamp, 'last_checked': 0, 'last_live': None, 'live': False, 'slots': {}
+                }
+            entry['last_checked'] = timestamp
+            live = username in live_now
+            changed = changed or entry['live'] != live
+            entry['live'] = live
+            if live:
+                entry['last_live'] = timestamp
+                changed = changed or entry['slots'].get(slot) != today
+                entry['slots'][slot] = today
+            # Écrit seulement quand le palier peut changer, pas à chaque vérification
+            if changed:
+                state_store.put('poll_history', username, entry)
+
+poll_scheduler = StreamerPollScheduler()
+
+@tasks.loop(seconds=POLL_BASE_TICK_SECONDS)
 async def check_streams():
-    print(f"🔄 Vérification des streams Twitch - {datetime.now(TIMEZONE).strftime('%H:%M:%S')}")
+    with bot_stats.track_loop('check_streams'):
+        log.debug("🔄 Vérification des streams Twitch")
+    
+        # Un seul passage Helix par tick : les logins uniques de tous les salons,
+        # récupérés par lots de 100, puis redistribués à chaque salon
+        all_logins = list(dict.fromkeys(
+            username for streamer_list in streamers.values() for username in streamer_list
+        ))
+        if not all_logins:
+            return
+        now = datetime.now(TIMEZONE)
+        due_logins = poll_scheduler.due_logins(all_logins, now)
+        if not due_logins:
+            return
+        twitch_api.begin_tick()
+        fetch_started = time.perf_counter()
+        live_now, unchecked = await twitch_api.get_live_streams(due_logins)
+        tick_stats = twitch_api.end_tick()
+        if unchecked:
+            # Lots Helix en échec : ces logins gardent leur état et restent dus au prochain tick
+            unchecked = set(unchecked)
+            log.warning("⚠️ Helix: %d login(s) non vérifié(s) ce tick, état conservé", len(unchecked),
+                        extra={'count': len(unchecked)})
+            due_logins = [username for username in due_logins if username not in unchecked]
+        poll_scheduler.record(due_logins, live_now, now)
+        publish_stream_snapshot(due_logins, live_now, followed=set(all_logins))
+        due_set = set(due_logins)
+        log.info("📡 Helix: %d/%d login(s), %d requête(s), %d point(s) utilisés, %s restants",
+                 len(due_logins), len(all_logins), tick_stats['requests'], tick_stats['points_used'],
+                 tick_stats['ratelimit_remaining'], extra={'count': len(due_logins), 'duration_ms': round((time.perf_counter() - fetch_started) * 1000)})
+    
+        # Les salons sont traités en parallèle : un salon lent ne retarde pas les autres
+        async def process_channel(channel_id, streamer_list):
+            channel = bot.get_channel(channel_id)
+            if not channel:
+                return
+            try:
+                async with get_stream_channel_lock(channel_id):
+                    await update_channel_streams(channel, channel_id, streamer_list, live_now)
+            except Exception as e:
+                log.error("❌ Erreur streams pour le salon %s: %s", channel_id, e, extra={'channel': channel_id})
     
-    for channel_id, streamer_list in streamers.items():
-        if not streamer_list:
-            continue
-        channel = bot.get_channel(channel_id)
-        if not channel:
+        # Seuls les logins interrogés ce tick sont redistribués (les autres gardent leur état)
+        polled_by_channel = {
+            channel_id: [username for username in streamer_list if username in due_set]
+            for channel_id, streamer_list in list(streamers.items())
+        }
+        await asyncio.gather(*(
+            process_channel(channel_id, polled)
+            for channel_id, polled in polled_by_channel.items() if polled
+        ))
+
+def partial_message(channel_id, message_id):
+    """Référence légère vers un message : édition / suppression sans fetch ni cache"""
+    return bot.get_partial_messageable(channel_id).get_partial_message(message_id)
+
+def attach_stream_message(key, stored_msg, future):
+    """Renseigner l'alerte une fois réellement envoyée : le tick n'attend pas la file Discord"""
+    if future.cancelled() or future.exception() is not None:
+        # Envoi en échec : le prochain tick republiera l'alerte
+        if stream_messages.get(key) is stored_msg:
+            del stream_messages[key]
+        return
+    message = future.result()
+    if stream_messages.get(key) is not stored_msg:
+        # Stream terminé ou streamer retiré avant l'envoi : l'alerte n'a plus lieu d'être
+        discord_dispatcher.delete(message)
+        return
+    stored_msg['message_id'] = message.id
+    stored_msg['message_obj'] = message
+    persist_stream_message(key)
+
+def forget_missing_stream_message(key, future):
+    # Message supprimé pendant une absence du bot : le prochain tick republiera l'alerte
+    if not future.cancelled() and isinstance(future.exception(), discord.NotFound):
+        if stream_messages.pop(key, None) is not None:
+            persist_stream_message(key)
+
+def get_stream_channel_lock(channel_id):
+    """Verrou par salon : le polling et EventSub ne doivent pas publier deux fois la même alerte"""
+    if channel_id not in stream_channel_locks:
+        stream_channel_locks[channel_id] = asyncio.Lock()
+    return stream_channel_locks[channel_id]
+
+async def update_channel_streams(channel, channel_id, streamer_list, live_now):
+    """Publier / mettre à jour / retirer les alertes d'un salon à partir des streams en live"""
+    # Vérifier les nouveaux streams
+    for username in streamer_list:
+        if username not in live_now:
             continue
-        streams = await twitch_api.get_streams(streamer_list)
-        live_now = {s['user_login']: s for s in streams}
+        stream = live_now[username]
+        key = f"{channel_id}_{username}"
+        if key in stream_messages:
+            continue  # already live
         
-        # Vérifier les nouveaux streams
-        for username, stream in live_now.items():
-            key = f"{channel_id}_{username}"
-            if key in stream_messages:
-                continue  # already live
-            
-            # ✅ NOUVEAU : Embed avec nombre de viewers
-            embed = discord.Embed(
-                title=f"🔴 {stream['user_name']} est en live !",
-                description=stream['title'],
-                url=f"https://twitch.tv/{username}",
-                color=0x9146ff
-            )
-            
-            # ✅ NOUVEAU : Ajouter le nombre de viewers
-            viewer_count = stream.get('viewer_count', 0)
-            embed.add_field(
-                name="👥 Viewers", 
-                value=f"**{format_viewer_count(viewer_count)}** spectateurs", 
-                inline=True
-            )
-            
-            # Ajouter la catégorie/jeu si disponible
-            if stream.get('game_name'):
-                embed.add_field(
-                    name="🎮 Jeu", 
-                    value=stream['game_name'], 
-                    inline=True
-                )
-            
-            # Thumbnail
-            thumbnail_url = stream.get('thumbnail_url', '').replace('{width}', '1280').replace('{height}', '720')
-            if thumbnail_url:
-                embed.set_image(url=thumbnail_url)
-            
-            # ✅ NOUVEAU : Footer avec heure de début du stream
-            started_at = datetime.fromisoformat(stream['started_at'].replace('Z', '+00:00'))
-            started_at_paris = started_at.astimezone(TIMEZONE)
-            embed.set_footer(
-                text=f"Stream commencé à {started_at_paris.strftime('%H:%M')} • Mise à jour toutes les 2 min"
-            )
-            
-            ping_content = f"<@&{ping_roles.get(channel_id)}>" if ping_roles.get(channel_id) else None
-            msg = await channel.send(content=ping_content, embed=embed)
-            stream_messages[key] = {
-                'message_id': msg.id, 
-                'last_update': datetime.now(UTC).timestamp(),
-                'message_obj': msg  # ✅ NOUVEAU : Stocker l'objet message pour les mises à jour
-            }
-            
-            print(f"📺 Nouveau stream détecté: {stream['user_name']} ({viewer_count} viewers)")
+        # ✅ NOUVEAU : Embed avec nombre de viewers et heure de début du stream
+        viewer_count = stream.get('viewer_count', 0)
+        embed = build_stream_embed(stream, f"Mise à jour toutes les {format_poll_interval(POLL_TIERS['live'][0])}")
+        
+        ping_content = f"<@&{ping_roles.get(channel_id)}>" if ping_roles.get(channel_id) else None
+        send_future = discord_dispatcher.send(channel, content=ping_content, embed=embed)
+        stored_msg = stream_messages[key] = {
+            'message_id': None,  # Renseigné (avec message_obj) par attach_stream_message
+            'last_update': datetime.now(UTC).timestamp(),
+            'fingerprint': stream_fingerprint(stream),
+            'viewer_count': viewer_count
+        }
+        send_future.add_done_callback(
+            lambda future, key=key, stored_msg=stored_msg: attach_stream_message(key, stored_msg, future)
+        )
+        
+        log.info("📺 Nouveau stream détecté: %s (%s viewers)", stream['user_name'], viewer_count,
+                 extra={'channel': channel_id, 'streamer': username})
 
-        # ✅ NOUVEAU : Mettre à jour les embeds existants avec le nouveau nombre de viewers
-        for username in streamer_list:
-            key = f"{channel_id}_{username}"
-            
-            # Si le stream est toujours live, mettre à jour les viewers
-            if key in stream_messages and username in live_now:
-                try:
-                    stream = live_now[username]
-                    stored_msg = stream_messages[key]
-                    
-                    # Récupérer le message Discord
-                    if 'message_obj' in stored_msg:
-                        message = stored_msg['message_obj']
-                    else:
-                        message = await channel.fetch_message(stored_msg['message_id'])
-                        stream_messages[key]['message_obj'] = message
-                    
-                    # Créer l'embed mis à jour
-                    updated_embed = discord.Embed(
-                        title=f"🔴 {stream['user_name']} est en live !",
-                        description=stream['title'],
-                        url=f"https://twitch.tv/{username}",
-                        color=0x9146ff
-                    )
-                    
-                    viewer_count = stream.get('viewer_count', 0)
-                    updated_embed.add_field(
-                        name="👥 Viewers", 
-                        value=f"**{format_viewer_count(viewer_count)}** spectateurs", 
-                        inline=True
-                    )
-                    
-                    if stream.get('game_name'):
-                        updated_embed.add_field(
-                            name="🎮 Jeu", 
-                            value=stream['game_name'], 
-                            inline=True
-                        )
-                    
-                    thumbnail_url = stream.get('thumbnail_url', '').replace('{width}', '1280').replace('{height}', '720')
-                    if thumbnail_url:
-                        updated_embed.set_image(url=thumbnail_url)
-                    
-                    started_at = datetime.fromisoformat(stream['started_at'].replace('Z', '+00:00'))
-                    started_at_paris = started_at.astimezone(TIMEZONE)
-                    updated_embed.set_footer(
-                        text=f"Stream commencé à {started_at_paris.strftime('%H:%M')} • Dernière MàJ: {datetime.now(TIMEZONE).strftime('%H:%M')}"
-                    )
-                    
-                    # Mettre à jour le message
-                    await message.edit(embed=updated_embed)
-                    stream_messages[key]['last_update'] = datetime.now(UTC).timestamp()
-                    
-                    print(f"🔄 Stream mis à jour: {stream['user_name']} ({viewer_count} viewers)")
-                    
-                except Exception as e:
-                    print(f"❌ Erreur mise à jour embed pour {username}: {e}")
-            
-            # Si le stream n'est plus live, supprimer le message
-            elif key in stream_messages and username not in live_now:
-                try:
-                    if 'message_obj' in stream_messages[key]:
-                        await stream_messages[key]['message_obj'].delete()
-                    else:
-                        message = await channel.fetch_message(stream_messages[key]['message_id'])
-                        await message.delete()
-                    print(f"📴 Stream terminé: {username}")
-                except:
-                    pass  # Message déjà supprimé ou inaccessible
-                del stream_messages[key]
+    # ✅ NOUVEAU : Mettre à jour les embeds existants avec le nouveau nombre de viewers
+    for username in streamer_list:
+        key = f"{channel_id}_{username}"
+        
+        # Si le stream est toujours live, mettre à jour les viewers
+        if key in stream_messages and username in live_now:
+            try:
+                stream = live_now[username]
+                stored_msg = stream_messages[key]
+                
+                # Alerte encore dans la file d'envoi, ou rien de visible n'a changé : pas d'édition Discord
+                if stored_msg['message_id'] is None or not stream_needs_update(stored_msg, stream):
+                    continue
+                
+                # Récupérer le message Discord
+                if 'message_obj' in stored_msg:
+                    message = stored_msg['message_obj']
+                else:
+                    message = partial_message(channel_id, stored_msg['message_id'])
+                    stream_messages[key]['message_obj'] = message
+                
+                # Créer l'embed mis à jour
+                viewer_count = stream.get('viewer_count', 0)
+                updated_embed = build_stream_embed(stream, f"Dernière MàJ: {datetime.now(TIMEZONE).strftime('%H:%M')}")
+                
+                # Mettre à jour le message (fusionné avec une édition encore en attente)
+                edit_future = discord_dispatcher.edit(message, embed=updated_embed)
+                edit_future.add_done_callback(lambda future, key=key: forget_missing_stream_message(key, future))
+                stream_messages[key]['last_update'] = datetime.now(UTC).timestamp()
+                stream_messages[key]['fingerprint'] = stream_fingerprint(stream)
+                stream_messages[key]['viewer_count'] = viewer_count
+                persist_stream_message(key)
+                
+                # Une ligne par stream et par tick : échantillonnée
+                log.info("🔄 Stream mis à jour: %s (%s viewers)", stream['user_name'], viewer_count,
+                         extra={'channel': channel_id, 'streamer': username, 'sample_key': ('stream-update', key)})
+                
+            except Exception as e:
+                log.error("❌ Erreur mise à jour embed pour %s: %s", username, e, extra={'channel': channel_id, 'streamer': username})
+        
+        # Si le stream n'est plus live, supprimer le message
+        elif key in stream_messages and username not in live_now:
+            try:
+                # Alerte pas encore envoyée : attach_stream_message la supprimera à l'envoi
+                if 'message_obj' in stream_messages[key]:
+                    discord_dispatcher.delete(stream_messages[key]['message_obj'])
+                elif stream_messages[key]['message_id'] is not None:
+                    discord_dispatcher.delete(partial_message(channel_id, stream_messages[key]['message_id']))
+                log.info("📴 Stream terminé: %s", username, extra={'channel': channel_id, 'streamer': username})
+            except:
+                pass  # Message déjà supprimé ou inaccessible
+            del stream_messages[key]
+            persist_stream_message(key)
 
 @check_streams.before_loop
 async def before_check(): await bot.wait_until_ready()
 
+# Renouvellement proactif du token, bien avant son expiration
+TWITCH_TOKEN_RENEW_MARGIN = int(os.getenv("TWITCH_TOKEN_RENEW_MARGIN", 3600))
+
+@tasks.loop(minutes=10)
+async def renew_twitch_token():
+    if not TWITCH_CLIENT_ID or not TWITCH_CLIENT_SECRET:
+        return
+    if twitch_api.token_expires_in() <= TWITCH_TOKEN_RENEW_MARGIN:
+        with bot_stats.track_loop('renew_twitch_token'):
+            await twitch_api.refresh_token()
+        if twitch_api.token:
+            log.info("🔑 Token Twitch renouvelé (expire dans %dh)", int(twitch_api.token_expires_in() / 3600))
+
+@renew_twitch_token.before_loop
+async def before_renew_twitch_token(): await bot.wait_until_ready()
+
+# === TWITCH EVENTSUB ===
+EVENTSUB_MAX_AGE_SECONDS = 600
+eventsub_seen_ids = OrderedDict()
+# Une seule synchronisation à la fois (on_ready et les commandes peuvent se chevaucher)
+eventsub_sync_lock = asyncio.Lock()
+# La boucle asyncio ne garde qu'une référence faible aux tâches : on les retient jusqu'à leur fin
+background_tasks = set()
+
+def spawn_background(coro):
+    """Lancer une tâche de fond sans l'attendre, sans risquer qu'elle soit collectée en cours de route"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def verify_eventsub_signature(secret, message_id, timestamp, body, signature):
+    """Vérifier la signature HMAC-SHA256 d'un message EventSub"""
+    if not (secret and message_id and timestamp and signature):
+        return False
+    message = message_id.encode() + timestamp.encode() + body
+    expected = 'sha256=' + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+def eventsub_timestamp_is_fresh(timestamp):
+    """Refuser les messages trop anciens (protection contre le rejeu)"""
+    try:
+        sent_at = datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=UTC)
+    except ValueError:
+        return False
+    return abs((datetime.now(UTC) - sent_at).total_seconds()) <= EVENTSUB_MAX_AGE_SECONDS
+
+async def eventsub_callback(request):
+    """Route POST /eventsub : vérification, notifications et révocations Twitch"""
+    body = await request.read()
+    message_id = request.headers.get('Twitch-Eventsub-Message-Id')
+    timestamp = request.headers.get('Twitch-Eventsub-Message-Timestamp')
+    signature = request.headers.get('Twitch-Eventsub-Message-Signature')
+    message_type = request.headers.get('Twitch-Eventsub-Message-Type')
+    
+    if not verify_eventsub_signature(TWITCH_EVENTSUB_SECRET, message_id, timestamp, body, signature):
+        return web.Response(status=403, text="invalid signature")
+    if not eventsub_timestamp_is_fresh(timestamp):
+        return web.Response(status=403, text="stale message")
+    
+    # Twitch peut renvoyer le même message plusieurs fois
+    if message_id in eventsub_seen_ids:
+        return web.Response(status=204)
+    eventsub_seen_ids[message_id] = True
+    while len(eventsub_seen_ids) > 1000:
+        eventsub_seen_ids.popitem(last=False)
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return web.Response(status=400, text="invalid json")
+    
+    if message_type == 'webhook_callback_verification':
+        return web.Response(status=200, text=payload['challenge'], content_type='text/plain')
+    
+    if message_type == 'revocation':
+        subscription = payload.get('subscription', {})
+        log.warning("⚠️ Souscription EventSub révoquée: %s (%s)", subscription.get('type'), subscription.get('status'))
+        return web.Response(status=204)
+    
+    if message_type == 'notification':
+        sub_type = payload.get('subscription', {}).get('type')
+        event = payload.get('event', {})
+        # Répondre vite à Twitch, le traitement se fait en tâche de fond
+        if sub_type == 'stream.online':
+            spawn_background(handle_stream_online(event))
+        elif sub_type == 'stream.offline':
+            spawn_background(handle_stream_offline(event))
+    
+    return web.Response(status=204)
+
+def channels_following(username):
+    return [channel_id for channel_id, streamer_list in streamers.items() if username in streamer_list]
+
+def followed_logins_for_event(event):
+    """Logins suivis correspondant au diffuseur (par identifiant, pour couvrir les renommages)"""
+    candidates = twitch_api.user_cache.logins_for_id(event.get('broadcaster_user_id'))
+    candidates.append(event.get('broadcaster_user_login'))
+    return [username for username in dict.fromkeys(candidates) if username and channels_following(username)]
+
+async def dispatch_stream_state(username, live_now):
+    """Appliquer l'état d'un streamer à tous les salons qui le suivent (même code que le polling)"""
+    for channel_id in channels_following(username):
+        channel = bot.get_channel(channel_id)
+        if not channel:
+            continue
+        try:
+            async with get_stream_channel_lock(channel_id):
+                await update_channel_streams(channel, channel_id, [username], live_now)
+        except Exception as e:
+            log.error("❌ Erreur EventSub pour le salon %s: %s", channel_id, e, extra={'channel': channel_id, 'streamer': username})
+
+async def handle_stream_online(event):
+    usernames = followed_logins_for_event(event)
+    if not usernames:
+        return
+    log.info("⚡ EventSub: %s vient de passer en live", event.get('broadcaster_user_login'),
+             extra={'streamer': event.get('broadcaster_user_login')})
+    
+    # Helix peut mettre quelques secondes à exposer le stream : on réessaie un peu
+    stream = None
+    for _ in range(3):
+        streams, _ = await twitch_api.get_streams([event.get('broadcaster_user_id')])
+        if streams:
+            stream = streams[0]
+            break
+        await asyncio.sleep(5)
+    
+    if stream is None:
+        # Alerte minimale à partir de la notification, complétée au prochain polling
+        stream = {
+            'user_id': event.get('broadcaster_user_id'),
+            'user_login': event.get('broadcaster_user_login'),
+            'user_name': event.get('broadcaster_user_name', usernames[0]),
+            'title': '',
+            'viewer_count': 0,
+            'started_at': event.get('started_at') or datetime.now(UTC).isoformat()
+        }
+    
+    publish_stream_snapshot(usernames, {username: stream for username in usernames})
+    for username in usernames:
+        await dispatch_stream_state(username, {username: stream})
+
+async def handle_stream_offline(event):
+    usernames = followed_logins_for_event(event)
+    if not usernames:
+        return
+    log.info("⚡ EventSub: %s a terminé son live", event.get('broadcaster_user_login'),
+             extra={'streamer': event.get('broadcaster_user_login')})
+    publish_stream_snapshot(usernames, {})
+    for username in usernames:
+        await dispatch_stream_state(username, {})
+
+async def sync_eventsub_subscriptions():
+    """Créer les souscriptions manquantes et retirer celles des streamers plus suivis"""
+    if not EVENTSUB_ENABLED or not twitch_api.token:
+        return
+    async with eventsub_sync_lock:
+        try:
+            all_logins = list(dict.fromkeys(
+                username for streamer_list in streamers.values() for username in streamer_list
+            ))
+            user_ids, unresolved = await twitch_api.resolve_user_ids(all_logins) if all_logins else ({}, [])
+            wanted = set(user_ids.values())
+        
+            existing = {}
+            for subscription in await twitch_api.get_eventsub_subscriptions():
+                if subscription.get('transport', {}).get('callback') != TWITCH_EVENTSUB_CALLBACK:
+                    continue
+                if subscription.get('status') not in ('enabled', 'webhook_callback_verification_pending'):
+                    # Souscription révoquée ou en échec : on la recrée
+                    await twitch_api.delete_eventsub_subscription(subscription['id'])
+                    continue
+                broadcaster_id = subscription['condition'].get('broadcaster_user_id')
+                existing[(subscription['type'], broadcaster_id)] = subscription['id']
+        
+            created = 0
+            for broadcaster_id in wanted:
+                for sub_type in ('stream.online', 'stream.offline'):
+                    if (sub_type, broadcaster_id) not in existing:
+                        if await twitch_api.create_eventsub_subscription(sub_type, broadcaster_id) is not None:
+                            created += 1
+        
+            removed = 0
+            if unresolved:
+                # Résolution incomplète : un streamer non résolu n'est pas un streamer retiré
+                log.warning("⚠️ EventSub: %d login(s) non résolu(s), suppressions reportées à la prochaine synchronisation",
+                            len(unresolved))
+            else:
+                for (sub_type, broadcaster_id), subscription_id in existing.items():
+                    if broadcaster_id not in wanted:
+                        await twitch_api.delete_eventsub_subscription(subscription_id)
+                        removed += 1
+        
+            log.info("📬 EventSub synchronisé: %d créée(s), %d supprimée(s), %d streamer(s)", created, removed, len(wanted))
+        except Exception as e:
+            log.error("❌ Erreur synchronisation EventSub: %s", e)
+
 # === EVENTS ===
 events = {}
 event_id_counter = 1
-event_messages = {}
 notifications_sent = {}
 guild_role_configs = {}
 notification_messages = {}
 
+# Noms affichés des catégories, partagés par les embeds et les commandes de configuration
+CATEGORY_NAMES = MappingProxyType({
+    'lec': '🏆 LEC',
+    'lfl': '🇫🇷 LFL',
+    'rl': '🚗 Rocket League',
+    'r6': '🎯 Rainbow Six',
+    'chess': '♟️ Échecs'
+})
+
 class Event:
     def __init__(self, id, name, date, creator, guild_id, channel_id, role_id=None, category=None, stream=None, lieu=None, image=None, description=None):
         self.id = id
@@ -392,9 +1743,187 @@ class Event:
         self.image = image
         self.description = description
         self.created_at = get_current_time()
+        self.recurrence = None   # règle de la série, portée par sa prochaine occurrence uniquement
+        self.occurrence = 1
+
+class GuildEventIndex:
+    """Index par serveur des événements triés par date, maintenu à la création / suppression"""
+    def __init__(self):
+        self.by_guild = {}  # guild_id -> liste triée de (timestamp, event_id)
+
+    @staticmethod
+    def _key(event):
+        return (event.date.timestamp(), event.id)
+
+    def add(self, event):
+        bisect.insort(self.by_guild.setdefault(event.guild_id, []), self._key(event))
+
+    def remove(self, event):
+        entries = self.by_guild.get(event.guild_id)
+        if not entries:
+            return
+        key = self._key(event)
+        i = bisect.bisect_left(entries, key)
+        if i < len(entries) and entries[i] == key:
+            del entries[i]
+        if not entries:
+            del self.by_guild[event.guild_id]
+
+    def count(self, guild_id):
+        return len(self.by_guild.get(guild_id, []))
+
+    def _events(self, entries):
+        return [events[event_id] for _, event_id in entries if event_id in events]
+
+    def _split(self, entries, moment):
+        # Premier index strictement après `moment`
+        return bisect.bisect_right(entries, (moment.timestamp(), float('inf')))
+
+    def upcoming(self, guild_id, now, limit):
+        """Les `limit` prochains événements (date > now)"""
+        entries = self.by_guild.get(guild_id, [])
+        i = self._split(entries, now)
+        return self._events(entries[i:i + limit])
+
+    def past(self, guild_id, now, limit):
+        """Les `limit` derniers événements passés (date <= now), du plus ancien au plus récent"""
+        entries = self.by_guild.get(guild_id, [])
+        i = self._split(entries, now)
+        return self._events(entries[max(0, i - limit):i])
+
+    def between(self, guild_id, start=None, end=None):
+        """Événements avec start <= date < end (bornes optionnelles), triés par date"""
+        entries = self.by_guild.get(guild_id, [])
+        lo = bisect.bisect_left(entries, (start.timestamp(), -1)) if start else 0
+        hi = bisect.bisect_left(entries, (end.timestamp(), -1)) if end else len(entries)
+        return self._events(entries[lo:hi])
+
+guild_event_index = GuildEventIndex()
+
+def next_event_id():
+    global event_id_counter
+    event_id = event_id_counter
+    event_id_counter += 1
+    return event_id
+
+def register_event(event):
+    """Enregistrer un événement : index par serveur, notifications et persistance"""
+    events[event.id] = event
+    guild_event_index.add(event)
+    notifications_sent[event.id] = {"15min": False, "live": False}
+    notification_messages[event.id] = []
+    notification_scheduler.schedule(event)
+    persist_event(event.id)
+
+# === RÉCURRENCE ===
+# Une série n'existe en mémoire que par sa prochaine occurrence : l'occurrence suivante est
+# créée au passage en live de la précédente (ou à son nettoyage si le live a été manqué)
+RECURRENCE_ALIASES = {
+    'quotidien': ('DAILY', 1), 'daily': ('DAILY', 1),
+    'hebdo': ('WEEKLY', 1), 'hebdomadaire': ('WEEKLY', 1), 'weekly': ('WEEKLY', 1),
+    'bihebdo': ('WEEKLY', 2)
+}
+
+def parse_rrule_until(value):
+    """UNTIL au format RRULE : AAAAMMJJ (fin de journée locale), AAAAMMJJTHHMMSS ou AAAAMMJJTHHMMSSZ"""
+    if len(value) == 8:
+        return TIMEZONE.localize(datetime.strptime(value, "%Y%m%d").replace(hour=23, minute=59))
+    if value.endswith('Z'):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=UTC).astimezone(TIMEZONE)
+    return TIMEZONE.localize(datetime.strptime(value, "%Y%m%dT%H%M%S"))
+
+def parse_recurrence(text):
+    """« hebdo », « quotidien », « 3j » (tous les 3 jours) ou sous-ensemble RRULE
+    (FREQ=DAILY|WEEKLY;INTERVAL=n;COUNT=n;UNTIL=AAAAMMJJ) ; renvoie (règle, erreur)"""
+    value = text.strip()
+    lowered = value.lower()
+    if lowered in RECURRENCE_ALIASES:
+        freq, interval = RECURRENCE_ALIASES[lowered]
+        return {'freq': freq, 'interval': interval, 'count': None, 'until': None}, None
+    match = re.fullmatch(r'(\d+)\s*j(?:ours?)?', lowered)
+    if match:
+        value = f"FREQ=DAILY;INTERVAL={match.group(1)}"
+    elif lowered.startswith('rrule:'):
+        value = value[6:]
+    
+    parts = {}
+    for part in value.upper().split(';'):
+        key, sep, part_value = part.partition('=')
+        if not sep:
+            return None, f"élément de récurrence invalide: `{part}`"
+        parts[key.strip()] = part_value.strip()
+    freq = parts.pop('FREQ', None)
+    if freq not in ('DAILY', 'WEEKLY'):
+        return None, "FREQ doit valoir DAILY ou WEEKLY"
+    try:
+        interval = int(parts.pop('INTERVAL', 1))
+        count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+        until = parse_rrule_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    except ValueError:
+        return None, "INTERVAL / COUNT doivent être des entiers et UNTIL au format AAAAMMJJ"
+    if parts:
+        return None, f"élément(s) RRULE non supporté(s): {', '.join(parts)}"
+    if interval < 1 or (count is not None and count < 1):
+        return None, "INTERVAL et COUNT doivent être supérieurs à 0"
+    return {'freq': freq, 'interval': interval, 'count': count, 'until': until.isoformat() if until else None}, None
+
+def describe_recurrence(rule, occurrence=1):
+    interval = rule['interval']
+    if rule['freq'] == 'WEEKLY':
+        text = "Chaque semaine" if interval == 1 else f"Toutes les {interval} semaines"
+    else:
+        text = "Chaque jour" if interval == 1 else f"Tous les {interval} jours"
+    if rule.get('count'):
+        text += f" ({occurrence}/{rule['count']})"
+    if rule.get('until'):
+        text += f" jusqu'au {datetime.fromisoformat(rule['until']).strftime('%d/%m/%Y')}"
+    return text
+
+def next_occurrence_date(event, after):
+    """Première occurrence postérieure à `after` ; renvoie (date, numéro) ou (None, None) en fin de série.
+    Le pas est appliqué à l'heure locale puis relocalisé : 20h reste 20h après un changement d'heure."""
+    rule = event.recurrence
+    step = timedelta(days=rule['interval'] * (7 if rule['freq'] == 'WEEKLY' else 1))
+    until = datetime.fromisoformat(rule['until']) if rule.get('until') else None
+    naive = event.date.astimezone(TIMEZONE).replace(tzinfo=None)
+    occurrence = event.occurrence
+    while True:
+        naive += step
+        occurrence += 1
+        if rule.get('count') and occurrence > rule['count']:
+            return None, None
+        date = TIMEZONE.normalize(TIMEZONE.localize(naive))
+        if until is not None and date > until:
+            return None, None
+        if date > after:
+            return date, occurrence
+
+def spawn_next_occurrence(event):
+    """Créer et annoncer l'occurrence suivante d'un événement récurrent (au plus une fois)"""
+    if not event.recurrence:
+        return None
+    date, occurrence = next_occurrence_date(event, max(get_current_time(), event.date))
+    rule, event.recurrence = event.recurrence, None  # la série est transmise à l'occurrence suivante
+    persist_event(event.id)
+    if date is None:
+        log.info("🔁 Fin de la série %s (ID %s)", event.name, event.id, extra={'event_id': event.id})
+        return None
+    
+    following = Event(next_event_id(), event.name, date, event.creator, event.guild_id, event.channel_id,
+                      event.role_id, event.category, event.stream, event.lieu, event.image, event.description)
+    following.recurrence = rule
+    following.occurrence = occurrence
+    register_event(following)
+    channel = bot.get_channel(following.channel_id)
+    if channel:
+        spawn_background(announce_events(channel, [following]))
+    log.info("🔁 Occurrence %d de %s programmée le %s (ID %s)", occurrence, event.name, format_date(date), following.id,
+             extra={'event_id': following.id, 'channel': following.channel_id})
+    return following
 
 def save_guild_config(guild_id, config):
     guild_role_configs[guild_id] = config
+    state_store.put('guild_role_configs', guild_id, config)
 
 def get_guild_config(guild_id):
     return guild_role_configs.get(guild_id, {})
@@ -408,20 +1937,24 @@ def get_role_by_category(guild, category):
         return guild.get_role(role_id)
     return None
 
+def event_version(event):
+    """Champs sources des embeds d'un événement : tout changement invalide le rendu en cache"""
+    return (event.name, event.date, event.creator, event.category, event.lieu, event.stream, event.image, event.description,
+            repr(event.recurrence), event.occurrence)
+
 def create_event_embed(event, detailed=False):
-    embed = discord.Embed(title=f"🎉 {event.name}", timestamp=event.created_at, color=0x00AE86)
+    embed = embed_cache.render(('event', event.id, detailed), event_version(event),
+                               lambda: render_event_embed(event, detailed))
+    embed.timestamp = event.created_at
+    return embed
+
+def render_event_embed(event, detailed):
+    embed = discord.Embed(title=f"🎉 {event.name}", color=0x00AE86)
     embed.add_field(name="📅 Date", value=format_date(event.date), inline=True)
     
     # TOUJOURS afficher la catégorie en premier si elle existe
     if hasattr(event, 'category') and event.category:
-        category_names = {
-            'lec': '🏆 LEC',
-            'lfl': '🇫🇷 LFL', 
-            'rl': '🚗 Rocket League',
-            'r6': '🎯 Rainbow Six',
-            'chess': '♟️ Échecs'
-        }
-        category_display = category_names.get(event.category, f"🎮 {event.category.upper()}")
+        category_display = CATEGORY_NAMES.get(event.category, f"🎮 {event.category.upper()}")
         embed.add_field(name="🎮 Catégorie", value=category_display, inline=True)
     else:
         # Ajouter un champ vide pour l'alignement
@@ -429,6 +1962,8 @@ def create_event_embed(event, detailed=False):
     
     if event.lieu:
         embed.add_field(name="📍 Lieu", value=event.lieu, inline=True)
+    if event.recurrence:
+        embed.add_field(name="🔁 Récurrence", value=describe_recurrence(event.recurrence, event.occurrence), inline=True)
     if event.stream:
         embed.add_field(name="📺 Stream", value=event.stream, inline=False)
     if event.description and detailed:
@@ -446,6 +1981,12 @@ def create_event_embed(event, detailed=False):
 
 def create_notification_embed(event, minutes_before):
     """Créer un embed pour les notifications"""
+    embed = embed_cache.render(('notification', event.id, minutes_before), event_version(event),
+                               lambda: render_notification_embed(event, minutes_before))
+    embed.timestamp = get_current_time()
+    return embed
+
+def render_notification_embed(event, minutes_before):
     if minutes_before == 0:
         title = f"🔴 LIVE MAINTENANT - {event.name}"
         color = 0xFF0000  # Rouge
@@ -458,22 +1999,14 @@ def create_notification_embed(event, minutes_before):
     embed = discord.Embed(
         title=title,
         description=message,
-        color=color,
-        timestamp=get_current_time()
+        color=color
     )
     
     embed.add_field(name="📅 Heure de début", value=format_date(event.date), inline=True)
     
     # Afficher la catégorie dans les notifications
     if hasattr(event, 'category') and event.category:
-        category_names = {
-            'lec': '🏆 LEC',
-            'lfl': '🇫🇷 LFL', 
-            'rl': '🚗 Rocket League',
-            'r6': '🎯 Rainbow Six',
-            'chess': '♟️ Échecs'
-        }
-        category_display = category_names.get(event.category, event.category.upper())
+        category_display = CATEGORY_NAMES.get(event.category, event.category.upper())
         embed.add_field(name="🎮 Catégorie", value=category_display, inline=True)
     
     if event.lieu:
@@ -497,7 +2030,8 @@ def create_notification_embed(event, minutes_before):
     stream="Lien du stream (optionnel)",
     lieu="Lieu de l'événement (optionnel)",
     image="URL complète de l'image (doit commencer par http:// ou https://)",
-    description="Description de l'événement (optionnel)"
+    description="Description de l'événement (optionnel)",
+    recurrence="Répétition (optionnel) : hebdo, quotidien, 3j (tous les 3 jours) ou RRULE (FREQ=WEEKLY;INTERVAL=2;COUNT=10)"
 )
 @app_commands.choices(category=[
     app_commands.Choice(name="LEC", value="lec"),
@@ -516,10 +2050,9 @@ async def create_event(
     stream: Optional[str] = None,
     lieu: Optional[str] = None,
     image: Optional[str] = None,
-    description: Optional[str] = None
+    description: Optional[str] = None,
+    recurrence: Optional[str] = None
 ):
-    global event_id_counter
-    
     try:
         # Valider la date AVANT de defer pour éviter l'expiration
         dt = parse_date(date)
@@ -546,6 +2079,14 @@ async def create_event(
             )
             return
         
+        # Valider la règle de récurrence si fournie
+        rule = None
+        if recurrence:
+            rule, error = parse_recurrence(recurrence)
+            if error:
+                await interaction.response.send_message(f"❌ Récurrence invalide: {error}", ephemeral=True)
+                return
+        
         # MAINTENANT qu'on a validé, on peut defer
         await interaction.response.defer()
         
@@ -557,24 +2098,22 @@ async def create_event(
             else:
                 print(f"⚠️ DEBUG - Aucun rôle automatique trouvé pour {category}")
         
-        event = Event(event_id_counter, nom, dt, interaction.user.display_name, interaction.guild_id, interaction.channel_id, 
+        # L'ID est réservé avant tout await (un import peut tourner en parallèle)
+        event = Event(next_event_id(), nom, dt, interaction.user.display_name, interaction.guild_id, interaction.channel_id, 
                       role.id if role else None, category, stream, lieu, image, description)
-        events[event_id_counter] = event
+        event.recurrence = rule
+        register_event(event)
         embed = create_event_embed(event, detailed=True)
         
         # Envoyer l'embed dans le canal
         message = await interaction.followup.send(embed=embed)
         
-        # Stocker le message pour pouvoir le supprimer plus tard
+        # Supprimer le message principal 30 minutes après l'heure de début de l'événement
         try:
-            event_messages[event_id_counter] = message
+            message_expiry.schedule(message, event.date.timestamp() + EVENT_MESSAGE_TTL)
         except Exception as e:
             print(f"Erreur lors du stockage du message: {e}")
         
-        notifications_sent[event_id_counter] = {"15min": False, "live": False}
-        notification_messages[event_id_counter] = []
-        event_id_counter += 1
-        
     except Exception as e:
         print(f"❌ Erreur dans create_event: {e}")
         try:
@@ -588,6 +2127,231 @@ async def create_event(
         except Exception as inner_e:
             print(f"Erreur lors de l'envoi du message d'erreur: {inner_e}")
 
+# === IMPORT D'ÉVÉNEMENTS (CSV / iCalendar) ===
+EVENT_IMPORT_MAX_ROWS = int(os.getenv("EVENT_IMPORT_MAX_ROWS", 5000))
+EVENT_IMPORT_YIELD_EVERY = 200    # rendre la main à la boucle régulièrement
+EVENT_CATEGORIES = ('lec', 'lfl', 'rl', 'r6', 'chess', 'autre')
+
+async def iter_attachment_lines(attachment):
+    """Télécharger la pièce jointe en flux et produire ses lignes décodées"""
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
+        async with session.get(attachment.url) as response:
+            response.raise_for_status()
+            first = True
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8', errors='replace')
+                if first:
+                    line = line.lstrip('\ufeff')  # BOM Excel
+                    first = False
+                yield line.rstrip('\r\n')
+
+async def iter_csv_rows(lines):
+    """Lignes CSV -> (numéro de ligne, dict) ; en-tête obligatoire, séparateur , ou ;"""
+    header = None
+    delimiter = ','
+    buffer = []
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        buffer.append(line)
+        # Champ entre guillemets sur plusieurs lignes : attendre la fin de l'enregistrement
+        if sum(part.count('"') for part in buffer) % 2:
+            continue
+        record = '\n'.join(buffer)
+        buffer = []
+        if not record.strip():
+            continue
+        if header is None:
+            delimiter = ';' if record.count(';') > record.count(',') else ','
+            header = [column.strip().lower() for column in next(csv.reader([record], delimiter=delimiter))]
+            continue
+        values = next(csv.reader([record], delimiter=delimiter))
+        yield line_number, {column: value.strip() for column, value in zip(header, values)}
+
+def ics_unescape(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+def ics_to_local_date_str(value, params):
+    """DTSTART iCalendar -> chaîne DD/MM/YYYY HH:MM (heure de Paris), validée ensuite par parse_date"""
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        moment = TIMEZONE.localize(datetime.strptime(value[:8], "%Y%m%d"))
+    elif value.endswith('Z'):
+        moment = datetime.strptime(value[:15], "%Y%m%dT%H%M%S").replace(tzinfo=UTC)
+    else:
+        tz = TIMEZONE
+        if 'TZID' in params:
+            try:
+                tz = pytz.timezone(params['TZID'])
+            except pytz.UnknownTimeZoneError:
+                pass
+        moment = tz.localize(datetime.strptime(value[:15], "%Y%m%dT%H%M%S"))
+    return moment.astimezone(TIMEZONE).strftime("%d/%m/%Y %H:%M")
+
+async def iter_ics_rows(lines):
+    """VEVENT iCalendar -> (numéro de ligne, dict au format des colonnes CSV)"""
+    current = None
+    pending = None
+    line_number = 0
+    
+    def handle(prop_line):
+        nonlocal current
+        name_part, _, value = prop_line.partition(':')
+        name, *raw_params = name_part.split(';')
+        name = name.upper()
+        params = dict(p.split('=', 1) for p in raw_params if '=' in p)
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            current = {'_line': line_number}
+        elif name == 'END' and value.upper() == 'VEVENT' and current is not None:
+            row, current = current, None
+            return row
+        elif current is not None:
+            if name == 'SUMMARY':
+                current['nom'] = ics_unescape(value)
+            elif name == 'DTSTART':
+                try:
+                    current['date'] = ics_to_local_date_str(value, params)
+                except ValueError:
+                    current['date'] = value
+            elif name == 'LOCATION':
+                current['lieu'] = ics_unescape(value)
+            elif name == 'DESCRIPTION':
+                current['description'] = ics_unescape(value)
+            elif name == 'URL':
+                current['stream'] = value
+            elif name == 'CATEGORIES':
+                current['category'] = ics_unescape(value).split(',')[0]
+        return None
+    
+    async for line in lines:
+        line_number += 1
+        # Lignes repliées (RFC 5545) : une ligne commençant par un espace prolonge la précédente
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            row = handle(pending)
+            if row:
+                yield row.pop('_line'), row
+        pending = line
+    if pending is not None:
+        row = handle(pending)
+        if row:
+            yield row.pop('_line'), row
+
+def build_imported_event(row, guild, creator, channel_id, now):
+    """Valider une ligne importée avec les mêmes règles que /event-create ; renvoie (event, erreur)"""
+    nom = (row.get('nom') or row.get('name') or '').strip()
+    if not nom:
+        return None, "nom manquant"
+    dt = parse_date((row.get('date') or '').strip())
+    if not dt:
+        return None, f"date invalide « {row.get('date', '')} » (format DD/MM/YYYY HH:MM)"
+    if dt < now:
+        return None, "date dans le passé"
+    image = row.get('image') or None
+    if image and not image.startswith(('http://', 'https://')):
+        return None, "URL d'image invalide"
+    category = (row.get('category') or row.get('categorie') or 'autre').strip().lower()
+    if category not in EVENT_CATEGORIES:
+        category = 'autre'
+    role = get_role_by_category(guild, category) if category != 'autre' else None
+    event = Event(next_event_id(), nom, dt, creator, guild.id, channel_id, role.id if role else None,
+                  category, row.get('stream') or None, row.get('lieu') or None, image, row.get('description') or None)
+    return event, None
+
+async def announce_events(channel, imported):
+    """Annonces groupées (10 embeds / 6000 caractères par message) via la file d'envoi, dans l'ordre
+    chronologique. Chaque message expire avec le dernier événement de son lot.
+    Rendu hors cache : un import massif viderait le cache LRU pour des embeds publiés une seule fois."""
+    ordered = sorted(imported, key=lambda event: event.date)
+    rendered = []
+    for index, event in enumerate(ordered, 1):
+        embed = render_event_embed(event, detailed=True)
+        embed.timestamp = event.created_at
+        rendered.append((event, embed, len(embed)))
+        if index % EVENT_IMPORT_YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+    
+    sent = 0
+    for chunk in chunk_embeds(rendered, [size for _, _, size in rendered]):
+        future = discord_dispatcher.send(channel, embeds=[embed for _, embed, _ in chunk])
+        
+        def attach(future, expires_at=chunk[-1][0].date.timestamp() + EVENT_MESSAGE_TTL):
+            if future.cancelled() or future.exception() is not None:
+                return
+            message_expiry.schedule(future.result(), expires_at)
+        
+        future.add_done_callback(attach)
+        sent += len(chunk)
+        if sent >= EVENT_IMPORT_YIELD_EVERY:
+            sent = 0
+            await asyncio.sleep(0)
+
+@bot.tree.command(name="event-import", description="Importer des événements depuis un fichier CSV ou iCalendar (.ics)")
+@app_commands.describe(
+    fichier="CSV (colonnes: nom, date, category, lieu, stream, image, description) ou fichier .ics",
+    annoncer="Publier les événements importés dans le salon (jusqu'à 10 par message)"
+)
+async def import_events(interaction: discord.Interaction, fichier: discord.Attachment, annoncer: bool = True):
+    if not interaction.user.guild_permissions.manage_events:
+        await interaction.response.send_message(
+            "❌ Vous n'avez pas les permissions pour importer des événements!",
+            ephemeral=True
+        )
+        return
+    
+    filename = fichier.filename.lower()
+    if filename.endswith('.ics'):
+        parser = iter_ics_rows
+    elif filename.endswith(('.csv', '.txt')):
+        parser = iter_csv_rows
+    else:
+        await interaction.response.send_message("❌ Format non supporté : fournissez un fichier .csv ou .ics", ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True)
+    
+    now = get_current_time()
+    imported = []
+    errors = []
+    rows = 0
+    try:
+        async for line_number, row in parser(iter_attachment_lines(fichier)):
+            rows += 1
+            if rows > EVENT_IMPORT_MAX_ROWS:
+                errors.append(f"limite de {EVENT_IMPORT_MAX_ROWS} lignes atteinte, le reste est ignoré")
+                break
+            event, error = build_imported_event(row, interaction.guild, interaction.user.display_name, interaction.channel_id, now)
+            if error:
+                errors.append(f"ligne {line_number}: {error}")
+            else:
+                imported.append(event)
+            if rows % EVENT_IMPORT_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+    except Exception as e:
+        await interaction.followup.send(f"❌ Erreur lors de la lecture du fichier: {e}", ephemeral=True)
+        return
+    
+    # Insertion groupée : un seul passage dans l'index, le planificateur et la persistance
+    for index, event in enumerate(imported, 1):
+        register_event(event)
+        if index % EVENT_IMPORT_YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+    
+    if annoncer and imported:
+        await announce_events(interaction.channel, imported)
+    
+    response = f"✅ **{len(imported)}** événement(s) importé(s) sur {rows} ligne(s)."
+    if imported:
+        response += f"\n🆔 IDs {imported[0].id} à {imported[-1].id}"
+    if errors:
+        response += f"\n⚠️ **{len(errors)}** ligne(s) ignorée(s):\n" + "\n".join(f"• {error}" for error in errors[:10])
+        if len(errors) > 10:
+            response += f"\n… et {len(errors) - 10} autre(s)"
+    await interaction.followup.send(response[:2000], ephemeral=True)
+    print(f"📥 Import de {fichier.filename}: {len(imported)} événement(s), {len(errors)} erreur(s)")
+
 @bot.tree.command(name="test-notification", description="Tester une notification (admin seulement)")
 @app_commands.describe(event_id="ID de l'événement à tester")
 async def test_notification(interaction: discord.Interaction, event_id: int):
@@ -622,12 +2386,23 @@ async def debug_bot(interaction: discord.Interaction):
 
 **Système de notifications:**
 - Actif: {'✅' if notification_system.is_running() else '❌'}
-- Prochaine exécution: {notification_system.next_iteration}
+- Prochaine échéance: {datetime.fromtimestamp(notification_scheduler.next_deadline(), TIMEZONE).strftime('%d/%m %H:%M:%S') if notification_scheduler.next_deadline() else 'aucune'}
+- Actions programmées: {len(notification_scheduler)}
+- Retard de livraison: {notification_lag.summary()}
+- Suppressions programmées: {len(message_expiry)} (prochaine: {datetime.fromtimestamp(message_expiry.next_deadline(), TIMEZONE).strftime('%d/%m %H:%M:%S') if message_expiry.next_deadline() else 'aucune'}) {message_expiry.stats}
 
 **Système Twitch:**
-- Actif: {'✅ (2min)' if check_streams.is_running() else '❌'}
-- Token valide: {'✅' if twitch_api.token else '❌'}
+- Actif: {'✅ (adaptatif, tick ' + str(POLL_BASE_TICK_SECONDS) + 's)' if check_streams.is_running() else '❌'}
+- Paliers de polling: {poll_scheduler.last_plan or 'aucun'}
+- Token valide: {'✅' if twitch_api.token else '❌'} (expire dans {int(twitch_api.token_expires_in() / 60)} min)
 - Prochaine vérification: {check_streams.next_iteration}
+- Dernier tick Helix: {twitch_api.last_tick_stats or 'aucun'}
+- Cache logins: {twitch_api.user_cache.stats()}
+
+**File d'envoi Discord:**
+- En attente: {discord_dispatcher.pending_count()} ({len(discord_dispatcher.workers)} salon(s))
+- Compteurs: {discord_dispatcher.stats}
+- Cache d'embeds: {len(embed_cache.entries)} rendu(s), {embed_cache.stats}
 
 **Serveur Web:**
 - Runner actif: {'✅' if web_runner is not None else '❌'}
@@ -638,16 +2413,32 @@ async def debug_bot(interaction: discord.Interaction):
 - Événements: {len(events)}
 - Notifications tracked: {len(notifications_sent)}
 - Configurations rôles: {len(guild_role_configs)}
-- Streamers suivis: {sum(len(s) for s in streamers.values())}
+- Streamers suivis: {bot_stats.streamers_total}
 - Messages de stream actifs: {len(stream_messages)}
 
+**Persistance:**
+- Base: {STATE_DB_PATH} ({'✅ ouverte' if state_store.conn is not None else '❌ fermée'})
+- Écritures en attente: {len(state_store.pending)}
+- Compteurs: {state_store.stats}
+
 **Bot:**
 - Connecté: {'✅' if bot.is_ready() else '❌'}
+- En ligne depuis: {bot_stats.uptime_text()} (démarré le {bot_stats.started_at.strftime('%d/%m %H:%M')})
+- Boucles: {', '.join(f"{name} {loop['last_duration_s']}s/{loop['errors']} err" for name, loop in bot_stats.loops.items()) or 'aucune'}
 - Latence: {round(bot.latency * 1000)}ms
+- Boucle asyncio: {loop_monitor.summary()}
 - Guilds: {len(bot.guilds)}
 """
     
-    await interaction.response.send_message(debug_info, ephemeral=True)
+    # Limite Discord de 2000 caractères : découpage par sections
+    chunks = [""]
+    for section in debug_info.split("\n\n"):
+        if chunks[-1] and len(chunks[-1]) + len(section) + 2 > 2000:
+            chunks.append("")
+        chunks[-1] += ("\n\n" if chunks[-1] else "") + section[:2000]
+    await interaction.response.send_message(chunks[0], ephemeral=True)
+    for chunk in chunks[1:]:
+        await interaction.followup.send(chunk, ephemeral=True)
 
 @bot.tree.command(name="ping", description="Tester la connexion du bot")
 async def ping(interaction: discord.Interaction):
@@ -662,9 +2453,269 @@ async def ping(interaction: discord.Interaction):
     embed.add_field(name="⚡ Latence", value=f"{latency}ms", inline=True)
     embed.add_field(name="🤖 Statut", value="✅ En ligne" if bot.is_ready() else "❌ Hors ligne", inline=True)
     embed.add_field(name="🌐 Serveur Web", value="✅ Actif" if web_runner is not None else "❌ Inactif", inline=True)
+    loop_stats = loop_monitor.summary()
+    if 'p95_lag_s' in loop_stats:
+        embed.add_field(name="⏱️ Boucle", value=f"retard p95 {round(loop_stats['p95_lag_s'] * 1000)}ms, "
+                                               f"{loop_stats['blocked_count']} blocage(s)", inline=True)
     
     await interaction.response.send_message(embed=embed)
 
+# === PERSISTANCE (SQLite) ===
+# Les mutations sont mises en attente en mémoire puis écrites par lots dans un thread,
+# sans jamais bloquer la boucle asyncio.
+# Sur Render, le système de fichiers du service est effacé à chaque déploiement / redémarrage :
+# STATE_DB_PATH doit pointer vers un disque persistant (ex: /var/data/bot_state.db, voir render.yaml)
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+STATE_FLUSH_SECONDS = int(os.getenv("STATE_FLUSH_SECONDS", 5))
+
+class StateStore:
+    """Stockage clé/valeur SQLite (WAL) avec écriture différée et regroupée"""
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.pending = {}  # (collection, clé) -> JSON, ou None pour une suppression
+        self.flush_lock = asyncio.Lock()
+        self.inflight = None  # Écriture en cours dans le thread (survit à l'annulation de flush)
+        self.stats = {'flushes': 0, 'rows_written': 0, 'last_flush_ms': None}
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (collection, key)) WITHOUT ROWID"
+        )
+        conn.commit()
+        return conn
+
+    def _load_all(self):
+        data = {}
+        for collection, key, value in self.conn.execute("SELECT collection, key, value FROM state"):
+            data.setdefault(collection, {})[key] = json.loads(value)
+        return data
+
+    async def load(self):
+        """Ouvrir la base et charger tout l'état en une seule requête"""
+        self.conn = await asyncio.to_thread(self._open)
+        return await asyncio.to_thread(self._load_all)
+
+    def put(self, collection, key, value):
+        if self.conn is None:
+            return
+        self.pending[(collection, str(key))] = json.dumps(value)
+
+    def delete(self, collection, key):
+        if self.conn is None:
+            return
+        self.pending[(collection, str(key))] = None
+
+    def _write_batch(self, batch):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO state (collection, key, value) VALUES (?, ?, ?)",
+                [(collection, key, value) for (collection, key), value in batch.items() if value is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM state WHERE collection = ? AND key = ?",
+                [(collection, key) for (collection, key), value in batch.items() if value is None]
+            )
+
+    async def flush(self):
+        """Écrire toutes les mutations en attente dans une seule transaction"""
+        if self.conn is None or not self.pending:
+            return
+        async with self.flush_lock:
+            await self._flush()
+
+    def _requeue(self, batch):
+        # Réinjecter le lot sans écraser les mutations plus récentes
+        for item, value in batch.items():
+            self.pending.setdefault(item, value)
+
+    async def _flush(self):
+        # Appelé avec flush_lock
+        if self.conn is None or not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        started = datetime.now(UTC).timestamp()
+        self.inflight = asyncio.ensure_future(asyncio.to_thread(self._write_batch, batch))
+        try:
+            # L'annulation de flush (arrêt du bot) n'interrompt pas la transaction en cours
+            await asyncio.shield(self.inflight)
+        except asyncio.CancelledError:
+            # Issue inconnue : le lot est réinjecté, sa réécriture par close() est idempotente
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            self._requeue(batch)
+            log.error("❌ Erreur écriture état SQLite: %s", e)
+            return
+        self.stats['flushes'] += 1
+        self.stats['rows_written'] += len(batch)
+        self.stats['last_flush_ms'] = round((datetime.now(UTC).timestamp() - started) * 1000, 1)
+
+    async def close(self):
+        """Dernière écriture puis fermeture, après l'éventuelle transaction encore en cours"""
+        async with self.flush_lock:
+            if self.inflight is not None and not self.inflight.done():
+                await asyncio.wait([self.inflight])
+            await self._flush()
+            if self.conn is not None:
+                await asyncio.to_thread(self.conn.close)
+                self.conn = None
+
+state_store = StateStore(STATE_DB_PATH)
+
+def event_to_dict(event):
+    return {
+        'id': event.id, 'name': event.name, 'date': event.date.isoformat(), 'creator': event.creator,
+        'guild_id': event.guild_id, 'channel_id': event.channel_id, 'role_id': event.role_id,
+        'category': event.category, 'stream': event.stream, 'lieu': event.lieu, 'image': event.image,
+        'description': event.description, 'created_at': event.created_at.isoformat(),
+        'recurrence': event.recurrence, 'occurrence': event.occurrence
+    }
+
+def event_from_dict(data):
+    event = Event(
+        data['id'], data['name'], datetime.fromisoformat(data['date']).astimezone(TIMEZONE), data['creator'],
+        data['guild_id'], data['channel_id'], data.get('role_id'), data.get('category'), data.get('stream'),
+        data.get('lieu'), data.get('image'), data.get('description')
+    )
+    event.created_at = datetime.fromisoformat(data['created_at']).astimezone(TIMEZONE)
+    event.recurrence = data.get('recurrence')
+    event.occurrence = data.get('occurrence', 1)
+    return event
+
+def persist_event(event_id):
+    """Mettre en attente l'écriture d'un événement, de ses notifications et du compteur d'ID"""
+    if event_id in events:
+        state_store.put('events', event_id, event_to_dict(events[event_id]))
+        state_store.put('notifications_sent', event_id, notifications_sent.get(event_id, {}))
+    else:
+        state_store.delete('events', event_id)
+        state_store.delete('notifications_sent', event_id)
+    state_store.put('meta', 'event_id_counter', event_id_counter)
+
+def persist_streamers(channel_id):
+    # Appelé après chaque mutation d'une liste de streamers : le compteur global suit
+    bot_stats.set_streamer_count(channel_id, len(streamers.get(channel_id, ())))
+    if streamers.get(channel_id):
+        state_store.put('streamers', channel_id, streamers[channel_id])
+    else:
+        state_store.delete('streamers', channel_id)
+
+def persist_stream_message(key):
+    stored_msg = stream_messages.get(key)
+    if stored_msg is None:
+        state_store.delete('stream_messages', key)
+        return
+    if stored_msg['message_id'] is None:
+        return  # Envoi en attente : persisté par attach_stream_message
+    # L'objet message Discord n'est pas sérialisable : seuls les identifiants sont conservés
+    state_store.put('stream_messages', key, {
+        'message_id': stored_msg['message_id'],
+        'channel_id': int(key.split('_', 1)[0]),
+        'last_update': stored_msg.get('last_update'),
+        'fingerprint': stored_msg.get('fingerprint'),
+        'viewer_count': stored_msg.get('viewer_count', 0)
+    })
+
+async def load_state():
+    """Chargement groupé de l'état persisté au démarrage"""
+    global event_id_counter
+    try:
+        data = await state_store.load()
+    except Exception as e:
+        print(f"❌ Impossible d'ouvrir la base d'état {STATE_DB_PATH}: {e}")
+        return
+    if os.getenv("RENDER") and not os.getenv("STATE_DB_PATH"):
+        # Render définit RENDER ; sans disque persistant, l'état repart de zéro à chaque déploiement
+        log.warning("⚠️ STATE_DB_PATH non défini sur Render : %s sera perdu au prochain déploiement", STATE_DB_PATH)
+    
+    for key, value in data.get('streamers', {}).items():
+        streamers[int(key)] = value
+        bot_stats.set_streamer_count(int(key), len(value))
+    for key, value in data.get('ping_roles', {}).items():
+        ping_roles[int(key)] = value
+    for key, value in data.get('guild_role_configs', {}).items():
+        guild_role_configs[int(key)] = value
+    # Les messages restaurés sont manipulés via des PartialMessage : aucun fetch au redémarrage
+    for key, value in data.get('stream_messages', {}).items():
+        value['message_obj'] = partial_message(value['channel_id'], value['message_id'])
+        value['restored'] = True
+        stream_messages[key] = value
+    for key, value in data.get('poll_history', {}).items():
+        poll_scheduler.restore(key, value)
+    for key, value in data.get('message_expiry', {}).items():
+        message_expiry.restore(value['channel_id'], int(key), value['expires_at'])
+    for key, value in data.get('notifications_sent', {}).items():
+        notifications_sent[int(key)] = value
+    restored_at = get_current_time().timestamp()
+    for key, value in data.get('events', {}).items():
+        event = event_from_dict(value)
+        events[event.id] = event
+        guild_event_index.add(event)
+        notifications_sent.setdefault(event.id, {"15min": False, "live": False})
+        notification_messages[event.id] = []
+        if skip_missed_notifications(event, restored_at):
+            persist_event(event.id)
+        notification_scheduler.schedule(event)
+    # Anciennes bases : les messages d'événements étaient supprimés par le planificateur de notifications
+    for key, value in data.get('event_messages', {}).items():
+        if int(key) in events:
+            message_expiry.schedule(partial_message(value['channel_id'], value['message_id']),
+                                    events[int(key)].date.timestamp() + EVENT_MESSAGE_TTL)
+        state_store.delete('event_messages', key)
+    event_id_counter = max(
+        data.get('meta', {}).get('event_id_counter', 1),
+        max(events, default=0) + 1
+    )
+    
+    print(f"💾 État restauré depuis {STATE_DB_PATH}: {len(events)} événement(s), "
+          f"{bot_stats.streamers_total} streamer(s), {len(stream_messages)} message(s) de stream")
+
+state_reconciled = False
+
+def reconcile_restored_state():
+    """Premier on_ready après un redémarrage : écarter les messages des salons disparus.
+    Les alertes restantes sont éditées ou supprimées par le premier tick via la file d'envoi,
+    sans nouveau ping ni fetch."""
+    global state_reconciled
+    if state_reconciled:
+        return
+    state_reconciled = True
+    
+    dropped = 0
+    restored_keys = [key for key, stored_msg in stream_messages.items() if stored_msg.pop('restored', False)]
+    for key in restored_keys:
+        if bot.get_channel(stream_messages[key]['channel_id']) is None:
+            del stream_messages[key]
+            persist_stream_message(key)
+            dropped += 1
+    restored_alerts = len(restored_keys) - dropped
+    for message_id, (_, channel_id) in list(message_expiry.entries.items()):
+        if bot.get_channel(channel_id) is None:
+            message_expiry.cancel(message_id)
+            dropped += 1
+    
+    print(f"♻️ Réconciliation: {restored_alerts} alerte(s) live et {len(message_expiry)} suppression(s) "
+          f"programmée(s) reprises, {dropped} écarté(s)")
+
+@tasks.loop(seconds=STATE_FLUSH_SECONDS)
+async def flush_state():
+    with bot_stats.track_loop('flush_state'):
+        await state_store.flush()
+
+@bot.event
+async def setup_hook():
+    # Avant la connexion : l'état doit être en mémoire avant le premier tick / la première commande
+    loop_monitor.start()
+    await load_state()
+    if state_store.conn is not None and not flush_state.is_running():
+        flush_state.start()
+
 # === EVENTS DU BOT ===
 
 @bot.event
@@ -694,25 +2745,38 @@ async def on_ready():
         
         # Initialiser l'API Twitch
         print("🔗 Initialisation de l'API Twitch...")
-        await twitch_api.get_token()
+        await twitch_api.refresh_token()
         if twitch_api.token:
             print("✅ Token Twitch obtenu avec succès!")
         else:
             print("⚠️ Impossible d'obtenir le token Twitch")
         
+        # Reprendre les messages publiés avant le redémarrage
+        reconcile_restored_state()
+        
+        # Avec EventSub, le polling ne sert plus qu'à la réconciliation
+        if EVENTSUB_ENABLED:
+            check_streams.change_interval(minutes=EVENTSUB_RECONCILE_MINUTES)
+        
         # Démarrer les systèmes de tâches
         if not check_streams.is_running():
             check_streams.start()
-            print("✅ Système de vérification Twitch démarré! (toutes les 2 minutes)")
+            print(f"✅ Système de vérification Twitch démarré! (polling adaptatif, tick {POLL_BASE_TICK_SECONDS}s)")
         else:
             print("ℹ️ Système Twitch déjà en cours d'exécution")
         
+        if not renew_twitch_token.is_running():
+            renew_twitch_token.start()
+        
         if not notification_system.is_running():
             notification_system.start()
             print("✅ Système de notifications démarré!")
         else:
             print("ℹ️ Système de notifications déjà en cours d'exécution")
         
+        if not expire_messages.is_running():
+            expire_messages.start()
+        
         # Démarrer le serveur web si le PORT est défini
         port_env = os.getenv("PORT")
         if port_env:
@@ -724,6 +2788,12 @@ async def on_ready():
                 print("❌ ÉCHEC du démarrage du serveur web!")
         else:
             print("⚠️ Variable PORT non définie, serveur web non démarré")
+            if EVENTSUB_ENABLED:
+                print("⚠️ EventSub configuré mais inaccessible sans serveur web")
+        
+        # Le serveur web doit être prêt pour répondre au challenge de vérification
+        if EVENTSUB_ENABLED:
+            spawn_background(sync_eventsub_subscriptions())
             
         print("🚀 Bot complètement initialisé et prêt!")
         print("="*50)
@@ -734,6 +2804,7 @@ async def on_ready():
         print(f"  🔔 Notifications: {'✅' if notification_system.is_running() else '❌'}")
         print(f"  🌐 Serveur web: {'✅' if web_runner is not None else '❌'}")
         print(f"  🔑 Token Twitch: {'✅' if twitch_api.token else '❌'}")
+        print(f"  ⚡ EventSub: {'✅ (réconciliation ' + str(EVENTSUB_RECONCILE_MINUTES) + 'min)' if EVENTSUB_ENABLED else '❌ (polling seul)'}")
         print("="*50)
             
     except Exception as e:
@@ -802,9 +2873,29 @@ async def shutdown_bot():
             notification_system.cancel()
             print("🛑 Système de notifications arrêté")
         
+        if renew_twitch_token.is_running():
+            renew_twitch_token.cancel()
+        
+        if expire_messages.is_running():
+            expire_messages.cancel()
+        
         # Arrêter le serveur web
         await stop_web_server()
         
+        # Abandonner les envois Discord en attente
+        discord_dispatcher.close()
+        loop_monitor.stop()
+        
+        # Écrire les dernières mutations et fermer la base
+        if flush_state.is_running():
+            flush_state.cancel()
+        await state_store.close()
+        print("💾 État sauvegardé")
+        
+        # Fermer la session HTTP Twitch
+        await twitch_api.close()
+        print("🛑 Session Twitch fermée")
+        
         # Fermer le bot
         await bot.close()
         print("🛑 Bot fermé proprement")
@@ -821,81 +2912,319 @@ if hasattr(signal, 'SIGTERM'):
 if hasattr(signal, 'SIGINT'):
     signal.signal(signal.SIGINT, signal_handler)
 
-# Fonction pour supprimer un message après un délai
-async def delete_message_after_delay(message, delay_minutes):
-    await asyncio.sleep(delay_minutes * 60)
-    try:
-        await message.delete()
-    except:
-        pass  # Ignore si le message est déjà supprimé ou inaccessible
+# === ÉCHÉANCES ===
+# Tas d'échéances partagé par l'expiration des messages et les notifications :
+# une seule échéance vivante par clé, les entrées remplacées restent dans le tas et sont ignorées
+SCHEDULER_MAX_SLEEP = 3600  # réveil de sécurité même sans échéance
 
-@tasks.loop(minutes=1)
-async def notification_system():
+class DeadlineHeap:
+    """Échéances indexées par clé, triées par date, avec invalidation paresseuse"""
+    def __init__(self):
+        self.heap = []     # (échéance, clé, données)
+        self.entries = {}  # clé -> (échéance, données) ; seule entrée valide pour cette clé
+        self.wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, key, deadline, payload=None):
+        """Programmer (ou reporter) l'échéance d'une clé et réveiller l'attente en cours"""
+        self.entries[key] = (deadline, payload)
+        heapq.heappush(self.heap, (deadline, key, payload))
+        self.wakeup.set()
+
+    def remove(self, key):
+        return self.entries.pop(key, None)
+
+    def _discard_stale(self):
+        while self.heap:
+            deadline, key, payload = self.heap[0]
+            if self.entries.get(key) == (deadline, payload):
+                return
+            heapq.heappop(self.heap)
+
+    def next_deadline(self):
+        self._discard_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now_ts):
+        """Retirer et renvoyer les échéances dépassées : [(échéance, clé, données), ...]"""
+        due = []
+        while self.next_deadline() is not None and self.heap[0][0] <= now_ts:
+            deadline, key, payload = heapq.heappop(self.heap)
+            del self.entries[key]
+            due.append((deadline, key, payload))
+        return due
+
+    async def wait_next(self):
+        """Dormir jusqu'à la prochaine échéance (ou jusqu'à une nouvelle programmation)"""
+        self.wakeup.clear()
+        deadline = self.next_deadline()
+        timeout = SCHEDULER_MAX_SLEEP
+        if deadline is not None:
+            timeout = min(max(deadline - get_current_time().timestamp(), 0), SCHEDULER_MAX_SLEEP)
+        if timeout <= 0:
+            return
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+# === EXPIRATION DES MESSAGES ===
+# Toutes les suppressions programmées (notifications, annonces d'événements) dans un seul tas
+# persisté ; les messages échus ensemble sont supprimés par salon, en une requête groupée
+NOTIFICATION_MESSAGE_TTL = 5 * 60     # notification 15min / live
+EVENT_MESSAGE_TTL = 30 * 60           # annonce d'un événement, après son heure de début
+MESSAGE_EXPIRY_GRACE = float(os.getenv("MESSAGE_EXPIRY_GRACE", 30))
+
+class MessageExpiryScheduler(DeadlineHeap):
+    """Échéances de suppression des messages : message_id -> (échéance, channel_id)"""
+    def __init__(self):
+        super().__init__()
+        self.stats = {'scheduled': 0, 'expired': 0}
+
+    def restore(self, channel_id, message_id, expires_at):
+        self.push(message_id, expires_at, channel_id)
+
+    def schedule(self, message, expires_at):
+        """Programmer (ou reporter) la suppression d'un message à un timestamp donné"""
+        self.restore(message.channel.id, message.id, expires_at)
+        self.stats['scheduled'] += 1
+        state_store.put('message_expiry', message.id, {'channel_id': message.channel.id, 'expires_at': expires_at})
+
+    def cancel(self, message_id):
+        if self.remove(message_id) is not None:
+            state_store.delete('message_expiry', message_id)
+
+    def pop_due(self, now_ts):
+        """Retirer les messages échus, regroupés par salon : {channel_id: [message_id, ...]}"""
+        due = {}
+        for _, message_id, channel_id in super().pop_due(now_ts):
+            state_store.delete('message_expiry', message_id)
+            due.setdefault(channel_id, []).append(message_id)
+            self.stats['expired'] += 1
+        return due
+
+message_expiry = MessageExpiryScheduler()
+
+@tasks.loop()  # Cadence pilotée par les échéances
+async def expire_messages():
     try:
-        now = get_current_time()
-        print(f"🔔 DEBUG - Vérification des notifications à {now.strftime('%d/%m/%Y %H:%M:%S')} (heure française)")
-        
-        for event_id, event in list(events.items()):
-            if event_id not in notifications_sent:
+        await message_expiry.wait_next()
+        # Les échéances proches sont avancées de quelques secondes pour être supprimées ensemble
+        with bot_stats.track_loop('expire_messages'):
+            due = message_expiry.pop_due(get_current_time().timestamp() + MESSAGE_EXPIRY_GRACE)
+            for channel_id, message_ids in due.items():
+                discord_dispatcher.bulk_delete(channel_id, message_ids)
+        if due:
+            log.info("🧹 %d message(s) expiré(s) dans %d salon(s)", sum(len(ids) for ids in due.values()), len(due),
+                     extra={'count': sum(len(ids) for ids in due.values())})
+    except Exception as e:
+        log.exception("❌ ERREUR dans expire_messages: %s", e)
+
+@expire_messages.before_loop
+async def before_expire_messages():
+    await bot.wait_until_ready()
+
+# === PLANIFICATEUR DE NOTIFICATIONS ===
+# Actions successives d'un événement et leur décalage (secondes) par rapport à son début
+NOTIFICATION_ACTIONS = (
+    ('15min', -15 * 60),
+    ('live', 0),
+    ('cleanup', 2 * 3600)       # nettoyage complet de l'événement
+)
+# Au redémarrage, une notification « live » n'est plus envoyée au-delà de ce retard
+NOTIFICATION_RESTORE_GRACE = int(os.getenv("NOTIFICATION_RESTORE_GRACE", 5 * 60))
+
+def skip_missed_notifications(event, now_ts):
+    """Événement restauré : marquer comme faites les notifications manquées pendant l'arrêt.
+    Sans cela, un redémarrage pendant un match re-mentionne le rôle (15min puis live) pour
+    un événement déjà commencé, voire terminé. Le nettoyage reste programmé (et la série continue)."""
+    sent = notifications_sent[event.id]
+    late = now_ts - event.date.timestamp()
+    skipped = []
+    if late >= 0 and not sent.get('15min'):
+        sent['15min'] = True
+        skipped.append('15min')
+    if late > NOTIFICATION_RESTORE_GRACE and not sent.get('live'):
+        sent['live'] = True
+        skipped.append('live')
+    if skipped:
+        log.info("⏭️ Notification(s) manquée(s) ignorée(s) pour %s (ID %s): %s", event.name, event.id, ', '.join(skipped),
+                 extra={'event_id': event.id})
+    return bool(skipped)
+
+class NotificationScheduler(DeadlineHeap):
+    """File de priorité des échéances : une seule prochaine action par événement, event_id -> (échéance, action)"""
+    def _action_done(self, event_id, action):
+        sent = notifications_sent.get(event_id, {})
+        if action == '15min':
+            return sent.get('15min', False)
+        if action == 'live':
+            return sent.get('live', False)
+        return False
+
+    def schedule(self, event):
+        """(Re)programmer la prochaine action en attente d'un événement"""
+        self.remove(event.id)
+        if event.id not in notifications_sent:
+            return
+        for action, offset in NOTIFICATION_ACTIONS:
+            if self._action_done(event.id, action):
+                continue
+            self.push(event.id, event.date.timestamp() + offset, action)
+            return
+
+    def unschedule(self, event_id):
+        self.remove(event_id)
+
+notification_scheduler = NotificationScheduler()
+
+# Envois de notifications en parallèle entre salons, dans l'ordre au sein d'un salon
+NOTIFICATION_CONCURRENCY = int(os.getenv("NOTIFICATION_CONCURRENCY", 10))
+NOTIFICATION_COALESCE_WINDOW = float(os.getenv("NOTIFICATION_COALESCE_WINDOW", 5))
+
+class DeliveryLagStats:
+    """Retard de livraison des notifications : échéance prévue -> message envoyé"""
+    def __init__(self, window=500):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+        self.last = None
+
+    def record(self, lag):
+        lag = max(lag, 0.0)
+        self.samples.append(lag)
+        self.count += 1
+        self.max = max(self.max, lag)
+        self.last = lag
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0}
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'last_s': round(self.last, 2),
+            'avg_s': round(sum(ordered) / len(ordered), 2),
+            'p95_s': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            'max_s': round(self.max, 2)
+        }
+
+notification_lag = DeliveryLagStats()
+
+async def deliver_notifications(items, action):
+    """Envoyer une notification 15min / live groupée et mesurer le retard de chaque événement"""
+    minutes_before = 15 if action == '15min' else 0
+    notification_msg = await send_events_notification([event for _, event in items], minutes_before)
+    sent_at = get_current_time().timestamp()
+    if notification_msg:
+        for deadline, event in items:
+            # Échéance déjà dépassée à la création : le retard se mesure depuis la création
+            lag = sent_at - max(deadline, event.created_at.timestamp())
+            notification_lag.record(lag)
+            metrics.observe('bot_notification_lag_seconds', max(lag, 0.0))
+            if event.id in notification_messages:
+                notification_messages[event.id].append(notification_msg)
+        # Suppression du message de notification après 5 minutes
+        message_expiry.schedule(notification_msg, sent_at + NOTIFICATION_MESSAGE_TTL)
+    for _, event in items:
+        if event.id in notifications_sent:
+            notifications_sent[event.id][action] = True
+            persist_event(event.id)
+    log.info("🔔 Notification %s envoyée: %s", action, ", ".join(f"{event.name} (ID {event.id})" for _, event in items),
+             extra={'action': action, 'channel': items[0][1].channel_id, 'event_id': [event.id for _, event in items],
+                    'count': len(items)})
+
+def coalesce_notifications(items):
+    """Regrouper les notifications d'un salon par type, en lots qui respectent les limites d'embeds Discord"""
+    by_action = {}
+    for deadline, event, action in items:
+        by_action.setdefault(action, []).append((deadline, event))
+    batches = []
+    for action, action_items in by_action.items():
+        minutes_before = 15 if action == '15min' else 0
+        # Rendu mis en cache : send_events_notification réutilise les mêmes embeds
+        sizes = [len(create_notification_embed(event, minutes_before)) for _, event in action_items]
+        for chunk in chunk_embeds(action_items, sizes):
+            batches.append((action, chunk))
+    return batches
+
+async def process_due_notifications():
+    """Exécuter toutes les actions échues, puis programmer l'action suivante de chaque événement"""
+    semaphore = asyncio.Semaphore(NOTIFICATION_CONCURRENCY)
+    
+    async def deliver_channel(items):
+        async with semaphore:
+            for action, batch in coalesce_notifications(items):
+                try:
+                    await deliver_notifications(batch, action)
+                except Exception as e:
+                    log.error("❌ Erreur notification %s pour %d événement(s): %s", action, len(batch), e,
+                              extra={'action': action, 'event_id': [event.id for _, event in batch]})
+                for _, event in batch:
+                    if event.id in events:
+                        notification_scheduler.schedule(event)
+    
+    while True:
+        # Les échéances très proches sont traitées ensemble pour pouvoir être regroupées
+        due = notification_scheduler.pop_due(get_current_time().timestamp() + NOTIFICATION_COALESCE_WINDOW)
+        if not due:
+            return
+        by_channel = {}
+        for deadline, event_id, action in due:
+            event = events.get(event_id)
+            if event is None:
                 continue
             
-            delta = event.date - now
-            minutes = int(delta.total_seconds() / 60)
-            
-            # Notification 15 minutes avant
-            if minutes <= 15 and not notifications_sent[event_id]["15min"]:
-                notification_msg = await send_event_notification(event, 15)
-                if notification_msg:
-                    notification_messages[event_id].append(notification_msg)
-                    # Programmer la suppression du message de notification après 5 minutes
-                    asyncio.create_task(delete_message_after_delay(notification_msg, 5))
-                notifications_sent[event_id]["15min"] = True
-            
-            # Notification live (0 minute)
-            elif minutes <= 0 and not notifications_sent[event_id]["live"]:
-                notification_msg = await send_event_notification(event, 0)
-                if notification_msg:
-                    notification_messages[event_id].append(notification_msg)
-                    # Programmer la suppression du message de notification après 5 minutes
-                    asyncio.create_task(delete_message_after_delay(notification_msg, 5))
-                notifications_sent[event_id]["live"] = True
-            
-            # Supprimer le message principal 30 minutes après l'heure de début de l'événement
-            elif delta.total_seconds() < -1800:  # -30 minutes après l'événement
-                if event_id in event_messages:
-                    try: 
-                        await event_messages[event_id].delete()
-                    except: 
-                        pass
-                    del event_messages[event_id]
+            # Notification 15 minutes avant / live : regroupées par salon (ordre des échéances conservé)
+            if action in ('15min', 'live'):
+                if action == 'live':
+                    spawn_next_occurrence(event)
+                by_channel.setdefault(event.channel_id, []).append((deadline, event, action))
+                continue
             
             # Nettoyage des événements passés (après 2 heures)
-            elif delta.total_seconds() < -7200:  # 2 heures après l'événement
+            if action == 'cleanup':
+                spawn_next_occurrence(event)  # live manqué : la série continue quand même
                 await delete_event_message(event_id)
-                
+        
+        await asyncio.gather(*(deliver_channel(items) for items in by_channel.values()))
+
+@tasks.loop()  # Cadence pilotée par les échéances du planificateur
+async def notification_system():
+    try:
+        await notification_scheduler.wait_next()
+        with bot_stats.track_loop('notification_system'):
+            await process_due_notifications()
     except Exception as e:
-        print(f"❌ ERREUR dans notification_system: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ ERREUR dans notification_system: %s", e)
 
 async def send_event_notification(event, minutes_before):
+    return await send_events_notification([event], minutes_before)
+
+async def send_events_notification(event_list, minutes_before):
+    """Une seule notification (jusqu'à 10 embeds) pour des événements d'un même salon"""
     try:
-        channel = bot.get_channel(event.channel_id)
+        channel = bot.get_channel(event_list[0].channel_id)
         if not channel: 
             return None
         
-        embed = create_notification_embed(event, minutes_before)
+        embeds = [create_notification_embed(event, minutes_before) for event in event_list]
         
-        content = ""
-        if event.role_id:
-            role = channel.guild.get_role(event.role_id)
-            if role:
-                content = role.mention
+        # Une mention par rôle, même si plusieurs événements le ciblent
+        mentions = []
+        for event in event_list:
+            if event.role_id:
+                role = channel.guild.get_role(event.role_id)
+                if role and role.mention not in mentions:
+                    mentions.append(role.mention)
+        content = " ".join(mentions)
         
-        sent_message = await channel.send(content=content, embed=embed)
+        sent_message = await discord_dispatcher.send(channel, content=content, embeds=embeds)
         return sent_message
     except Exception as e:
-        print(f"❌ Erreur lors de l'envoi de notification: {e}")
+        log.error("❌ Erreur lors de l'envoi de notification: %s", e, extra={'channel': event_list[0].channel_id})
         return None
 
 async def delete_event_message(event_id):
@@ -903,13 +3232,16 @@ async def delete_event_message(event_id):
     try:
         # Nettoyer les données (ne pas essayer de supprimer le message principal ici car déjà fait)
         if event_id in events:
+            guild_event_index.remove(events[event_id])
             del events[event_id]
         if event_id in notifications_sent:
             del notifications_sent[event_id]
         if event_id in notification_messages:
             del notification_messages[event_id]
+        notification_scheduler.unschedule(event_id)
+        persist_event(event_id)
     except Exception as e:
-        print(f"Erreur lors du nettoyage: {e}")
+        log.error("Erreur lors du nettoyage: %s", e, extra={'event_id': event_id})
 
 @notification_system.before_loop
 async def before_notification_system():
@@ -941,14 +3273,6 @@ async def config_roles(interaction: discord.Interaction, category: str, role: Op
     # Récupérer la config actuelle
     config = get_guild_config(interaction.guild_id)
     
-    category_names = {
-        'lec': '🏆 LEC',
-        'lfl': '🇫🇷 LFL', 
-        'rl': '🚗 Rocket League',
-        'r6': '🎯 Rainbow Six',
-        'chess': '♟️ Échecs'
-    }
-    
     if role is None:
         # Supprimer la configuration pour cette catégorie
         if category in config:
@@ -956,12 +3280,12 @@ async def config_roles(interaction: discord.Interaction, category: str, role: Op
             save_guild_config(interaction.guild_id, config)
             await interaction.response.send_message(
                 f"✅ Configuration supprimée!\n"
-                f"**{category_names.get(category, category.upper())}** n'aura plus de rôle de notification.",
+                f"**{CATEGORY_NAMES.get(category, category.upper())}** n'aura plus de rôle de notification.",
                 ephemeral=True
             )
         else:
             await interaction.response.send_message(
-                f"⚠️ Aucune configuration trouvée pour **{category_names.get(category, category.upper())}**",
+                f"⚠️ Aucune configuration trouvée pour **{CATEGORY_NAMES.get(category, category.upper())}**",
                 ephemeral=True
             )
     else:
@@ -971,7 +3295,7 @@ async def config_roles(interaction: discord.Interaction, category: str, role: Op
         
         await interaction.response.send_message(
             f"✅ Configuration mise à jour!\n"
-            f"**{category_names.get(category, category.upper())}** → {role.mention}",
+            f"**{CATEGORY_NAMES.get(category, category.upper())}** → {role.mention}",
             ephemeral=True
         )
 
@@ -986,14 +3310,6 @@ async def show_config(interaction: discord.Interaction):
         )
         return
     
-    category_names = {
-        'lec': '🏆 LEC',
-        'lfl': '🇫🇷 LFL', 
-        'rl': '🚗 Rocket League',
-        'r6': '🎯 Rainbow Six',
-        'chess': '♟️ Échecs'
-    }
-    
     embed = discord.Embed(
         title="⚙️ Configuration des Rôles",
         color=0x00AE86,
@@ -1003,7 +3319,7 @@ async def show_config(interaction: discord.Interaction):
     for category, role_id in config.items():
         role = interaction.guild.get_role(role_id)
         role_text = role.mention if role else f"❌ Rôle supprimé (ID: {role_id})"
-        category_display = category_names.get(category, category.upper())
+        category_display = CATEGORY_NAMES.get(category, category.upper())
         
         embed.add_field(
             name=category_display,
@@ -1018,19 +3334,18 @@ async def list_events(interaction: discord.Interaction):
     # Répondre immédiatement avec defer
     await interaction.response.defer()
     
-    guild_events = [event for event in events.values() if event.guild_id == interaction.guild_id]
-    guild_events.sort(key=lambda x: x.date)
+    total = guild_event_index.count(interaction.guild_id)
     
-    if not guild_events:
+    if not total:
         await interaction.followup.send(
             "📅 Aucun événement programmé pour le moment."
         )
         return
     
-    # Séparer les événements futurs et passés
+    # Séparer les événements futurs et passés (index trié par date)
     now = get_current_time()
-    future_events = [event for event in guild_events if event.date > now]
-    past_events = [event for event in guild_events if event.date <= now]
+    future_events = guild_event_index.upcoming(interaction.guild_id, now, 10)
+    past_events = guild_event_index.past(interaction.guild_id, now, 5)
     
     embed = discord.Embed(
         title="📅 Liste des Événements",
@@ -1040,7 +3355,7 @@ async def list_events(interaction: discord.Interaction):
     
     if future_events:
         future_list = []
-        for event in future_events[:10]:  # Limiter à 10 événements
+        for event in future_events:  # Limité à 10 événements
             event_text = f"**{event.id}** - {event.name}\n📅 {format_date(event.date)}"
             if event.lieu:
                 event_text += f"\n📍 {event.lieu}"
@@ -1054,7 +3369,7 @@ async def list_events(interaction: discord.Interaction):
     
     if past_events:
         past_list = []
-        for event in past_events[-5:]:  # Les 5 derniers événements passés
+        for event in past_events:  # Les 5 derniers événements passés
             event_text = f"**{event.id}** - {event.name}\n📅 {format_date(event.date)}"
             past_list.append(event_text)
         
@@ -1064,7 +3379,7 @@ async def list_events(interaction: discord.Interaction):
             inline=False
         )
     
-    embed.set_footer(text=f"Total: {len(guild_events)} événement(s) | Utilisez /event-info <id> pour plus de détails")
+    embed.set_footer(text=f"Total: {total} événement(s) | Utilisez /event-info <id> pour plus de détails")
     
     await interaction.followup.send(embed=embed)
 
@@ -1176,6 +3491,11 @@ async def add_streamer(interaction: discord.Interaction, usernames: str):
         response_parts.append(f"⚠️ **Déjà suivi{'s' if len(already_exists) > 1 else ''} :** {', '.join(already_exists)}")
     if not added and already_exists:
         response_parts = ["⚠️ Tous les streamers sont déjà suivis dans ce salon!"]
+    
+    if added:
+        persist_streamers(channel_id)
+    if added and EVENTSUB_ENABLED:
+        spawn_background(sync_eventsub_subscriptions())
 
     await interaction.followup.send('\n'.join(response_parts))
 
@@ -1216,9 +3536,15 @@ async def remove_streamer(interaction: discord.Interaction, usernames: str):
             key = f"{channel_id}_{username}"
             if key in stream_messages:
                 del stream_messages[key]
+                persist_stream_message(key)
         else:
             not_found.append(username)
     
+    if removed:
+        persist_streamers(channel_id)
+    if removed and EVENTSUB_ENABLED:
+        spawn_background(sync_eventsub_subscriptions())
+    
     # Construire le message de réponse
     response_parts = []
     
@@ -1249,16 +3575,27 @@ async def list_streamers(interaction: discord.Interaction):
         timestamp=get_current_time()
     )
     
-    # Vérifier le statut des streamers
-    streams = await twitch_api.get_streams(streamer_list)
-    live_streamers = {s['user_login']: s for s in streams}
+    # Statut lu dans l'instantané du poller ; seuls les logins absents ou périmés sont demandés à Twitch
+    now = datetime.now(UTC).timestamp()
+    poll_now = datetime.now(TIMEZONE)
+    snapshot = live_snapshot
+    to_fetch = [
+        streamer for streamer in streamer_list
+        if streamer not in snapshot
+        or now - snapshot[streamer].checked_at > poll_scheduler.max_age(streamer, poll_now)
+    ]
+    if to_fetch:
+        fetched, unchecked = await twitch_api.get_live_streams(to_fetch)
+        publish_stream_snapshot([streamer for streamer in to_fetch if streamer not in unchecked], fetched)
+        snapshot = live_snapshot
     
     online_list = []
     offline_list = []
     
     for streamer in streamer_list:
-        if streamer in live_streamers:
-            stream_data = live_streamers[streamer]
+        status = snapshot.get(streamer)
+        if status and status.stream:
+            stream_data = status.stream
             viewer_count = stream_data.get('viewer_count', 0)
             online_list.append(f"🔴 **{streamer}** - {format_viewer_count(viewer_count)} viewers")
         else:
@@ -1270,7 +3607,8 @@ async def list_streamers(interaction: discord.Interaction):
     if offline_list:
         embed.add_field(name="⚫ Hors ligne", value="\n".join(offline_list), inline=False)
     
-    embed.set_footer(text="📡 Vérification toutes les 2 minutes")
+    oldest_check = min((snapshot[s].checked_at for s in streamer_list if s in snapshot), default=now)
+    embed.set_footer(text=f"📡 Vérification adaptative • Données d'il y a {max(0, int(now - oldest_check))}s")
     
     await interaction.followup.send(embed=embed)
 
@@ -1293,6 +3631,11 @@ async def clear_streamers(interaction: discord.Interaction):
     keys_to_remove = [key for key in stream_messages.keys() if key.startswith(f"{channel_id}_")]
     for key in keys_to_remove:
         del stream_messages[key]
+        persist_stream_message(key)
+    persist_streamers(channel_id)
+    
+    if EVENTSUB_ENABLED:
+        spawn_background(sync_eventsub_subscriptions())
     
     await interaction.response.send_message(f"✅ Liste vidée! **{count}** streamer(s) retiré(s) de ce salon.")
 
@@ -1304,6 +3647,7 @@ async def set_ping_role(interaction: discord.Interaction, role: discord.Role):
         return
     try:
         ping_roles[interaction.channel_id] = role.id
+        state_store.put('ping_roles', interaction.channel_id, role.id)
         await interaction.response.send_message(f"✅ Le rôle {role.mention} sera ping lorsque quelqu'un sera en live dans ce salon.", ephemeral=True)
     except Exception as e:
         await interaction.response.send_message(f"❌ Erreur : {e}", ephemeral=True)
@@ -1321,7 +3665,8 @@ async def help_command(interaction: discord.Interaction):
     
     # Événements
     events_commands = """
-`/event-create` - Créer un nouvel événement
+`/event-create` - Créer un nouvel événement (récurrent avec `recurrence`)
+`/event-import <fichier>` - Importer des événements (CSV / .ics) 🔒
 `/event-list` - Afficher tous les événements
 `/event-info <id>` - Détails d'un événement
 `/event-delete <id>` - Supprimer un événement 🔒
@@ -1374,7 +3719,9 @@ async def help_command(interaction: discord.Interaction):
     # Informations supplémentaires
     embed.add_field(
         name="ℹ️ **Informations**",
-        value="• Format de date: **DD/MM/YYYY HH:MM**\n• Notifications automatiques: 15min avant + live\n• Timezone: **Europe/Paris**\n• **Surveillance Twitch: toutes les 2 minutes avec viewers**",
+        value="• Format de date: **DD/MM/YYYY HH:MM**\n• Notifications automatiques: 15min avant + live\n• Timezone: **Europe/Paris**\n• **Surveillance Twitch: toutes les "
+              f"{format_poll_interval(POLL_TIERS['hot'][0])} à {format_poll_interval(POLL_TIERS['dormant'][0])} "
+              f"selon l'activité du streamer, viewers mis à jour toutes les {format_poll_interval(POLL_TIERS['live'][0])}**",
         inline=False
     )
     
@@ -1505,11 +3852,14 @@ async def notification_status(interaction: discord.Interaction):
     is_running = notification_system.is_running()
     twitch_running = check_streams.is_running()
     status_text += f"🔄 **Système actif:** {'✅ OUI' if is_running else '❌ NON'}\n"
-    status_text += f"📺 **Twitch actif:** {'✅ OUI (2min)' if twitch_running else '❌ NON'}\n"
+    status_text += f"📺 **Twitch actif:** {'✅ OUI (adaptatif)' if twitch_running else '❌ NON'}\n"
     status_text += f"🌐 **Serveur web:** {'✅ OUI' if web_runner is not None else '❌ NON'}\n"
     status_text += f"📊 **Événements totaux:** {len(events)}\n"
     status_text += f"🔔 **Dans le système de notif:** {len(notifications_sent)}\n"
-    status_text += f"📡 **Streams suivis:** {sum(len(s) for s in streamers.values())}\n\n"
+    lag = notification_lag.summary()
+    if lag['count']:
+        status_text += f"⏱️ **Retard de livraison:** moy. {lag['avg_s']}s, p95 {lag['p95_s']}s, max {lag['max_s']}s ({lag['count']} envois)\n"
+    status_text += f"📡 **Streams suivis:** {bot_stats.streamers_total}\n\n"
     
     if not events:
         status_text += "📅 Aucun événement en cours."
@@ -1518,10 +3868,8 @@ async def notification_status(interaction: discord.Interaction):
     
     now = get_current_time()
     
-    for event_id, event in events.items():
-        if event.guild_id != interaction.guild_id:
-            continue
-            
+    for event in guild_event_index.between(interaction.guild_id):
+        event_id = event.id
         time_diff = event.date - now
         minutes_until = int(time_diff.total_seconds() / 60)
         
@@ -1574,7 +3922,7 @@ async def check_notifications(interaction: discord.Interaction):
     
     # Appeler manuellement la fonction de notification
     try:
-        await notification_system.coro()
+        await process_due_notifications()
         await interaction.followup.send("✅ Vérification terminée! Consultez les logs.", ephemeral=True)
     except Exception as e:
         await interaction.followup.send(f"❌ Erreur lors de la vérification: {e}", ephemeral=True)
@@ -1593,10 +3941,13 @@ if __name__ == '__main__':
     print(f"  - TWITCH_CLIENT_ID: {'✅ Défini' if os.getenv('TWITCH_CLIENT_ID') else '❌ Manquant'}")
     print(f"  - TWITCH_CLIENT_SECRET: {'✅ Défini' if os.getenv('TWITCH_CLIENT_SECRET') else '❌ Manquant'}")
     print(f"  - PORT: {'✅ ' + os.getenv('PORT') if os.getenv('PORT') else '❌ Non défini'}")
+    print(f"  - EVENTSUB: {'✅ ' + TWITCH_EVENTSUB_CALLBACK if EVENTSUB_ENABLED else '❌ Désactivé (TWITCH_EVENTSUB_SECRET / TWITCH_EVENTSUB_CALLBACK)'}")
     print("-" * 50)
     
+    # discord.py journalise aussi via la racine : même file, même format
+    setup_logging()
     try:
-        bot.run(token)
+        bot.run(token, log_handler=None)
     except KeyboardInterrupt:
         print("\n🛑 Arrêt manuel détecté...")
     except Exception as e:
@@ -1605,3 +3956,4 @@ if __name__ == '__main__':
         traceback.print_exc()
     finally:
         print("👋 Bot arrêté!")
+        stop_logging()